@@ -1,38 +1,70 @@
-from flask import Flask, request, render_template
+from flask import Flask, Response, jsonify, request, render_template, send_file, stream_with_context, url_for
 import requests
 from dotenv import load_dotenv
 import os
 import sys
-from openai import OpenAI
-from bs4 import BeautifulSoup
-from drive import upload_to_folder
-from weasyprint import HTML
-from tiktok import search_tiktok, generate_tiktok_keywords, combined_tiktok_results
-from tiktok_transcript import extract_tiktok_transcripts
-from gemini import batch_summarize_urls_with_gemini, call_gemini_api
+import json
+import tempfile
+import threading
+import time
+from functools import partial
+from drive import upload_files_to_folder
+from tiktok import combined_tiktok_results
+from tiktok_transcript import iter_tiktok_transcripts
+from canonical import NearDuplicateIndex, canonical_url, url_source
+from relevance import RelevanceFilter
+from gemini import batch_summarize_urls_with_gemini, iter_structured_batches
 from searchapi import *
+from fanout import fan_out_search
+from pipeline import Pipeline, drain, process_in_batches
+from llm_scheduler import GEMINI_BATCH_MAX_ITEMS, GEMINI_MAX_IN_FLIGHT, truncate_to_tokens
+from search_cache import get_search_cache
+from summary_cache import get_summary_cache, summary_key
+from findings import get_findings_store
+from query_planner import QUERY_PLAN_BUDGET, QUERY_PLAN_ENABLED, get_query_planner
+from jobs import JobEvents, JobQueue
+from bulk import new_bulk_id, parse_brands, summarize_jobs
+from metrics import inc, render as render_metrics, span
+import logs
 
 
 load_dotenv()  # <-- Don't forget to load .env variables
 
-# Check command line arguments for mode
-mode = "production"  # Default mode
-if len(sys.argv) > 1:
-    if sys.argv[1].lower() == "test":
-        mode = "test"
-    elif sys.argv[1].lower() == "production":
-        mode = "production"
-    else:
-        print(f"[WARNING] Unknown mode '{sys.argv[1]}'. Using default mode: {mode}")
-        
-print(f"[INFO] Running in {mode.upper()} mode")
-
 app = Flask(__name__)
 
 SEARCH1_API_KEY = os.getenv("SEARCH1_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 FOLDER_ID = os.getenv("DRIVE_FOLDER_ID")
 MAX_RESULTS = 20
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "16"))  # searches in flight at once
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "120"))  # seconds per report
+NEAR_DUP_DEDUP = os.getenv("NEAR_DUP_DEDUP", "1") == "1"  # also drop results whose snippets nearly match
+NEAR_DUP_DISTANCE = int(os.getenv("NEAR_DUP_DISTANCE", "3"))  # max differing SimHash bits for a near-duplicate
+RELEVANCE_FILTER = os.getenv("RELEVANCE_FILTER", "1") == "1"  # skip results that never mention the brand
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.7"))  # minimum local relevance score to summarize
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))  # reports generated at the same time
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "8"))  # bulk-run reports generated at the same time
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "1"))  # PDF renders / Drive uploads at the same time
+EXPORT_MAX_ATTEMPTS = int(os.getenv("EXPORT_MAX_ATTEMPTS", "3"))
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "companyscraper-exports"))
+EXPORT_RETENTION = int(os.getenv("EXPORT_RETENTION", str(7 * 24 * 3600)))  # seconds to keep PDFs for download
+EXPORT_JSON = os.getenv("EXPORT_JSON", "0") == "1"  # also upload the raw results as JSON next to the PDF
+JOB_EVENTS_WAIT = 5.0  # seconds a job stream waits for news before sending a keep-alive
+
+# Bump whenever the web summary prompt changes so cached summaries are not reused
+WEB_PROMPT_VERSION = "web-v3"
+
+# Engines queried for every keyword, in the order their results are merged
+SEARCH_ENGINES = [
+    ("google", search_search1api),
+    ("reddit", search_search1api_reddit),
+    ("youtube", search_search1api_youtube),
+    ("yahoo", search_search1api_yahoo),
+    ("bing", search_search1api_bing),
+]
+
+# Result sections shown in results.html and the PDF, in display order
+SOURCE_GROUPS = ['reddit', 'youtube', 'x', 'google', 'facebook', 'trustpilot',
+                 'google_reviews', 'tiktok', 'instagram', 'other']
 
 # Define both sets of keywords
 PRODUCTION_KEYWORDS = [
@@ -44,13 +76,25 @@ PRODUCTION_KEYWORDS = [
 
 TEST_KEYWORDS = ["Scam"]
 
-# Set keywords and debug mode based on the selected mode
-if mode == "test":
-    NEGATIVE_KEYWORDS = TEST_KEYWORDS
-    debug_mode = True
-else:  # production mode
-    NEGATIVE_KEYWORDS = PRODUCTION_KEYWORDS
-    debug_mode = False
+
+def select_mode(name):
+    """Use the single test keyword and the debugger for "test", the full keyword list otherwise."""
+    global mode, NEGATIVE_KEYWORDS, debug_mode
+    mode = name.lower()
+    if mode not in ("test", "production"):
+        logs.warning(f"Unknown mode '{name}'. Using default mode: production")
+        mode = "production"
+    if mode == "test":
+        NEGATIVE_KEYWORDS = TEST_KEYWORDS
+        debug_mode = True
+    else:  # production mode
+        NEGATIVE_KEYWORDS = PRODUCTION_KEYWORDS
+        debug_mode = False
+    logs.info(f"Running in {mode.upper()} mode")
+
+
+# Importers (bulk.py, the WSGI server) take the mode from APP_MODE; `python app.py test` overrides it
+select_mode(os.getenv("APP_MODE", "production"))
 
 @app.route('/')
 def index():
@@ -62,181 +106,608 @@ def search():
     website = request.form["website"]
     description = request.form["description"]
     keyword = request.form["keyword"]
-    print(f"[INFO] Searching for brand: {brand}, Website: {website}")
-    print(f"[INFO] Business description: {description}")
-    print(f"[INFO] Primary keyword: {keyword}")
+    force_refresh = request.form.get("force_refresh") == "on"
+    incremental = request.form.get("incremental") == "on"
+
+    # Every report runs on a background worker; the page either fills itself from the
+    # job's event stream or polls the job until it is done
+    job_id = get_queue("reports").enqueue({"brand": brand, "website": website, "description": description,
+                                           "keyword": keyword, "force_refresh": force_refresh,
+                                           "incremental": incremental})
+    status_url = url_for('job_status', job_id=job_id)
+    result_url = url_for('job_result', job_id=job_id)
+    events_url = url_for('job_events', job_id=job_id)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(job_id=job_id, status_url=status_url, result_url=result_url, events_url=events_url), 202
+    if request.form.get("stream") == "on":
+        return render_template("results.html", results={}, brand=brand, stream_url=events_url)
+    return render_template("job.html", brand=brand, job_id=job_id,
+                           status_url=status_url, result_url=result_url)
+
+
+@app.route('/bulk', methods=['POST'])
+def bulk_search():
+    """Queue one report per brand from a JSON or CSV brand list (request body or 'file' upload)."""
+    upload = request.files.get("file")
+    if upload is not None:
+        try:
+            text = upload.read().decode("utf-8")
+        except UnicodeDecodeError:
+            return jsonify(error="The brand list must be UTF-8 text"), 400
+        fmt = "json" if (upload.filename or "").lower().endswith(".json") else None
+    else:
+        text = request.get_data(as_text=True)
+        fmt = "json" if request.is_json else ("csv" if request.mimetype == "text/csv" else None)
+    try:
+        payloads = parse_brands(text, fmt)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    bulk_id = new_bulk_id()
+    job_ids = get_queue("bulk-reports").enqueue_many(payloads, group=bulk_id)
+    return jsonify(bulk_id=bulk_id, status_url=url_for('bulk_status', bulk_id=bulk_id),
+                   jobs=[{"brand": payload["brand"], "job_id": job_id,
+                          "status_url": url_for('job_status', job_id=job_id)}
+                         for payload, job_id in zip(payloads, job_ids)]), 202
+
+
+@app.route('/bulk/<bulk_id>')
+def bulk_status(bulk_id):
+    jobs = get_queue("bulk-reports").get_group(bulk_id)
+    if not jobs:
+        return jsonify(error="Bulk run not found"), 404
+    summary = summarize_jobs(jobs)
+    for row in summary["brands"]:
+        row["result_url"] = url_for('job_result', job_id=row["job_id"])
+    return jsonify(bulk_id=bulk_id, **summary)
+
+
+def _get_report_job(job_id):
+    # Single reports and bulk-run reports live in separate queues
+    return get_queue("reports").get(job_id) or get_queue("bulk-reports").get(job_id)
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = _get_report_job(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    return jsonify(job_id=job["id"], status=job["status"], error=job["error"],
+                   created_at=job["created_at"], started_at=job["started_at"],
+                   finished_at=job["finished_at"], result_url=url_for('job_result', job_id=job_id))
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Render a finished report, or return it as JSON with ?format=json."""
+    job = _get_report_job(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    if job["status"] == "failed":
+        report = {"results": {}, "api_errors": [f"Error generating report: {job['error']}"], "search_error": True}
+    elif job["status"] != "done":
+        return jsonify(job_id=job_id, status=job["status"], error="Job has not finished yet"), 409
+    else:
+        report = job["result"]
+
+    if request.args.get("format") == "json":
+        return jsonify(report)
+    export_id = report.get("export_id")
+    return render_template("results.html", results=report["results"], brand=job["payload"]["brand"],
+                          api_errors=report["api_errors"] if report["api_errors"] else None,
+                          search_error=report["search_error"], new_count=report.get("new_count"),
+                          export_url=url_for('export_status', export_id=export_id) if export_id else None)
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    Server-sent events for a report job: one 'result' event per summarized item, then a
+    final 'done' event. Only reads the job's progress, so reloading the page never runs
+    the report again.
+    """
+    if _get_report_job(job_id) is None:
+        return jsonify(error="Job not found"), 404
+
+    def stream():
+        sent = 0
+        while True:
+            progress = report_events.read(job_id, sent, timeout=JOB_EVENTS_WAIT)
+            if progress is not None:
+                events, closed = progress
+                for kind, payload in events:
+                    yield _sse(kind, payload)
+                sent += len(events)
+                if closed:
+                    break
+                if events:
+                    continue
+            # Nothing new: the job may still be queued, or running in another process
+            if _get_report_job(job_id)["status"] in ("done", "failed"):
+                break
+            yield ": keep-alive\n\n"
+
+        job = _get_report_job(job_id)
+        report = job["result"] or {}
+        if not sent:
+            # Ran in another process or finished a while ago: replay the stored results
+            for group, results in report.get("results", {}).items():
+                for result in results:
+                    yield _sse("result", dict(result, source=group))
+        if job["status"] == "failed":
+            done = {"api_errors": [f"Error generating report: {job['error']}"], "search_error": True}
+        else:
+            done = {"api_errors": report["api_errors"], "search_error": report["search_error"],
+                    "new_count": report.get("new_count")}
+        export_id = report.get("export_id")
+        done["export_url"] = url_for('export_status', export_id=export_id) if export_id else None
+        yield _sse("done", done)
 
-    # Create search queries with brand name and keyword
-    brand_keyword = f"{brand} {keyword}"
-    queries = [f"{brand_keyword} {kw}" for kw in NEGATIVE_KEYWORDS]
-    all_results = []
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    # 
-    # Track any API errors
-    api_errors = []
 
-    for query in queries:
-        print(f"[DEBUG] Searching with query: {query}")
-        try:
-            # Add source information to each result
-            results = search_search1api(query, MAX_RESULTS)
-            for result in results:
-                result['source'] = 'google'
-                
-            results_reddit = search_search1api_reddit(query, MAX_RESULTS)
-            for result in results_reddit:
-                result['source'] = 'reddit'
-                
-            results_youtube = search_search1api_youtube(query, MAX_RESULTS)
-            for result in results_youtube:
-                result['source'] = 'youtube'
-                
-            results_bing = search_search1api_bing(query, MAX_RESULTS)
-            for result in results_bing:
-                result['source'] = 'bing'
-            
-            results_yahoo = search_search1api_yahoo(query, MAX_RESULTS)
-            for result in results_yahoo:
-                result['source'] = 'yahoo'
-            
-            # Debug output
-            print(f"[DEBUG] Found {len(results)} Google results for query: {query}")
-            print(f"[DEBUG] Found {len(results_reddit)} Reddit results for query: {query}")
-            print(f"[DEBUG] Found {len(results_youtube)} YouTube results for query: {query}")
-            print(f"[DEBUG] Found {len(results_bing)} Bing results for query: {query}")
-            print(f"[DEBUG] Found {len(results_yahoo)} Yahoo results for query: {query}")
-
-            all_results.extend(results)
-            all_results.extend(results_reddit)
-            all_results.extend(results_youtube)
-            all_results.extend(results_yahoo)
-            all_results.extend(results_bing)
-
-            # Debug output
-            print(f"[DEBUG] Total results after query '{query}': {len(all_results)}")
-        except Exception as e:
-            error_msg = f"Error searching for query '{query}': {str(e)}"
-            print(f"[ERROR] {error_msg}")
-            api_errors.append(error_msg)
-
-    results_tiktok = combined_tiktok_results(brand, brand_keyword)
-    tiktok_urls = [result.get("link") for result in results_tiktok if result.get("link")]
-    tiktok_transcripts = []
-    if tiktok_urls:
-        try:
-            tiktok_transcripts = extract_tiktok_transcripts(tiktok_urls)
-            print(f"[INFO] Successfully extracted {len(tiktok_transcripts)} TikTok transcripts")
-        except Exception as e:
-            error_msg = f"Error extracting TikTok transcripts: {str(e)}"
-            print(f"[ERROR] {error_msg}")
-            api_errors.append(error_msg)
+def _sse(kind, payload):
+    return f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
 
 
+def _run_report_job(payload, emit=None):
+    return run_report(**payload, on_event=emit)
 
-    # If we have no results and there were API errors, return error page
-    if not all_results and api_errors:
-        return render_template("results.html", results={}, brand=brand, 
-                              api_errors=api_errors, search_error=True)
-
-    # Remove duplicates while preserving source information
-    seen = set()
-    unique_urls = []
-    for res in all_results:
-        url = res.get("link")
-        source = res.get("source", "other")
-        
-        if res.get("snippet"):
-            snippet = res.get("snippet")[:300]
-        else:
-            snippet = res.get("title")
-            
-        if url and url not in seen:
-            seen.add(url)
-            unique_urls.append((url, snippet, source))
 
-    print(f"[INFO] Total unique URLs found: {len(unique_urls)}")
+def group_source(source):
+    """Map a result's source onto one of the SOURCE_GROUPS sections; unknown sources go under google."""
+    return source if source in SOURCE_GROUPS else 'google'
 
-    # Batch process URLs instead of one at a time
-    try:
-        summarized = batch_summarize_urls(brand, description, unique_urls, 10)
-    except Exception as e:
-        error_msg = f"Error summarizing content: {str(e)}"
-        print(f"[ERROR] {error_msg}")
-        api_errors.append(error_msg)
-        return render_template("results.html", results={}, brand=brand, 
-                              api_errors=api_errors, search_error=True)
 
-    #try batch process tiktok urls using gemini
-        # Batch process URLs instead of one at a time
-    try:
-        summarized.extend(batch_summarize_urls_with_gemini(brand, description, tiktok_transcripts, 5))
-    except Exception as e:
-        error_msg = f"Error summarizing content: {str(e)}"
-        print(f"[ERROR] {error_msg}")
-        api_errors.append(error_msg)
-        return render_template("results.html", results={}, brand=brand, 
-                              api_errors=api_errors, search_error=True)
+def run_report(brand, website, description, keyword, force_refresh=False, incremental=False, search_budget=None,
+               on_event=None):
+    """
+    Run the whole search / TikTok -> summarize -> PDF pipeline for one brand.
+
+    `on_event(kind, payload)` is called with ("result", result_dict) as soon as each
+    summarized item is ready, so callers can show results before the report finishes.
+
+    Every judged URL is recorded in the brand's findings store. With `incremental`,
+    URLs judged by earlier runs are not summarized again; their stored findings are
+    reported alongside the new ones instead.
+
+    Each result carries is_new (None on a brand's first run) and first_seen.
+
+    The query planner picks which keyword x engine searches run, skipping those
+    that added few unique URLs for this brand before; `search_budget` caps how
+    many run (QUERY_PLAN_BUDGET when None, 0 for no cap).
+
+    Returns:
+        dict: {"results": grouped results, "api_errors": [...], "search_error": bool,
+               "new_count": new results, or None on a brand's first run}
+    """
+    with span("report"):
+        report = _run_report(brand, website, description, keyword, force_refresh, incremental,
+                             QUERY_PLAN_BUDGET if search_budget is None else search_budget, on_event)
+    inc("reports_total", outcome="search_error" if report["search_error"] else "ok")
+    for source, results in report["results"].items():
+        inc("report_results_total", len(results), source=source)
+    return report
+
+
+def _run_report(brand, website, description, keyword, force_refresh, incremental, search_budget, on_event):
+    # Canonical URLs judged by earlier runs for this brand, and when each was first seen
+    findings = get_findings_store()
+    seen = findings.seen(brand)
+    run_started = time.time()
+
+    def mark(result):
+        first_seen = seen.get(canonical_url(result["url"]))
+        return dict(result, is_new=(first_seen is None) if seen else None,
+                    first_seen=time.strftime("%Y-%m-%d", time.localtime(first_seen or run_started)))
+
+    def emit_results(results):
+        if on_event:
+            for result in results:
+                on_event("result", mark(dict(result, source=group_source(result.get('source', 'google')))))
+
+    def record(kind):
+        return lambda outcomes: findings.record_many(brand, kind, outcomes)
+
+    # Earlier findings are reported as stored; only URLs never judged go to the LLM
+    previous = []
+    if incremental and seen:
+        previous = [result for result in findings.findings(brand) if canonical_url(result["url"]) in seen]
+        logs.info(f"Incremental run: {len(seen)} URLs already judged, {len(previous)} stored findings")
+        emit_results(previous)
+
+    logs.info(f"Searching for brand: {brand}, Website: {website}")
+    logs.info(f"Business description: {description}")
+    logs.info(f"Primary keyword: {keyword}")
+
+    # Create search queries with brand name and keyword
+    brand_keyword = f"{brand} {keyword}"
+    queries = [f"{brand_keyword} {kw}" for kw in NEGATIVE_KEYWORDS]
+    keyword_of = dict(zip(queries, NEGATIVE_KEYWORDS))
+
+    # Bypass cached search results when the user asked for fresh ones
+    engines = SEARCH_ENGINES
+    if force_refresh:
+        engines = [(source, partial(search_fn, force_refresh=True)) for source, search_fn in SEARCH_ENGINES]
+
+    # The web branch (search -> dedup -> summarize) and the TikTok branch
+    # (discover -> transcripts -> summarize) share nothing, so every stage runs
+    # at once and hands its output downstream as soon as it has it.
+    pipeline = Pipeline()
+    search_results = pipeline.queue()
+    web_items = pipeline.queue()
+    relevant_items = pipeline.queue()
+    tiktok_links = pipeline.queue()
+    tiktok_items = pipeline.queue()
+    web = {"results": 0, "api_errors": [], "order": {}, "summaries": []}
+    tiktok = {"order": {}, "summaries": []}
+
+    def search_stage():
+        # Order keys let the final report keep the serial query-then-engine order
+        query_index = {query: i for i, query in enumerate(queries)}
+        engine_index = {source: i for i, (source, _) in enumerate(engines)}
+
+        # Only the searches that added unique URLs for this brand before, within the budget
+        pairs = None
+        planner = get_query_planner() if QUERY_PLAN_ENABLED else None
+        if planner is not None:
+            planned, skipped = planner.plan(brand, NEGATIVE_KEYWORDS, list(engine_index), search_budget)
+            pairs = {(f"{brand_keyword} {kw}", source) for kw, source in planned}
+            logs.info(f"Query plan: {len(planned)} of {len(queries) * len(engines)} searches "
+                      f"({skipped['low_yield']} low-yield, {skipped['budget']} over budget skipped)")
+            inc("search_planned_total", len(planned), outcome="run")
+            for reason, count in skipped.items():
+                inc("search_planned_total", count, outcome=f"skipped_{reason}")
+        found = {}
+
+        def forward(query, source, results):
+            web["results"] += len(results)
+            found[(keyword_of[query], source)] = [res.get("link") for res in results]
+            for position, res in enumerate(results):
+                search_results.put(((query_index[query], engine_index[source], position), res))
+
+        _, api_errors, _ = fan_out_search(
+            queries, engines, MAX_RESULTS,
+            max_workers=SEARCH_CONCURRENCY, deadline=SEARCH_DEADLINE, on_results=forward, pairs=pairs)
+        web["api_errors"] = api_errors
+        if planner is not None:
+            planner.record(brand, found)
+        logs.debug(f"Total results after all queries: {web['results']}")
+        logs.info(f"Search cache stats: {get_search_cache().stats()}")
+
+    def dedup_stage():
+        # Remove duplicates while preserving source information. URLs are compared
+        # in canonical form, so tracking parameters, mobile hosts and alternate
+        # Reddit/YouTube/TikTok links for the same post count as one.
+        kept_urls = {}
+        near_duplicates = NearDuplicateIndex(NEAR_DUP_DISTANCE) if NEAR_DUP_DEDUP else None
+        dropped = 0
+        repeated = 0
+        known = 0
+        for order, res in drain(search_results):
+            url = res.get("link")
+            source = res.get("source", "other")
+            
+            if res.get("snippet"):
+                snippet = res.get("snippet")[:300]
+            else:
+                snippet = res.get("title")
+
+            if not url:
+                continue
+            key = canonical_url(url)
+            if key in kept_urls:
+                repeated += 1
+                kept = kept_urls[key]
+                if kept in web["order"]:
+                    web["order"][kept] = min(web["order"][kept], order)
+                continue
+            kept_urls[key] = url
+            if near_duplicates is not None and near_duplicates.add(snippet):
+                dropped += 1
+                continue
+            if incremental and key in seen:
+                known += 1
+                continue
+            web["order"][url] = order
+            # The title only feeds the relevance filter; the summarizer sees the snippet
+            web_items.put((url, snippet, source, res.get("title")))
+        logs.info(f"Total unique URLs found: {len(web['order'])} "
+                  f"({dropped} near-duplicate snippets dropped, {known} already judged)")
+        inc("dedup_dropped_total", repeated, reason="same_url")
+        inc("dedup_dropped_total", dropped, reason="near_duplicate")
+        inc("incremental_skipped_total", known, kind="web")
+
+    def relevance_stage():
+        # Results whose URL, title and snippet never mention the brand would come back "UNRELATED"
+        relevance = RelevanceFilter(brand, description, RELEVANCE_THRESHOLD)
+        for url, snippet, source, title in drain(web_items):
+            if not RELEVANCE_FILTER or relevance.is_relevant(url, snippet, title):
+                relevant_items.put((url, snippet, source))
+            else:
+                inc("relevance_filtered_total")
+        if RELEVANCE_FILTER:
+            logs.info(f"Relevance filter: {relevance.stats()}")
+
+    def web_summarize_stage():
+        # Batch process URLs instead of one at a time; each group is packed into calls by token size
+        for summarized in process_in_batches(
+                relevant_items, GEMINI_BATCH_MAX_ITEMS,
+                lambda batch: batch_summarize_urls(brand, description, batch, on_result=emit_results,
+                                                   on_outcome=record("web")),
+                GEMINI_MAX_IN_FLIGHT):
+            web["summaries"].extend(summarized)
+
+    def tiktok_discovery_stage():
+        known = 0
+        for result in combined_tiktok_results(brand, brand_keyword):
+            link = result.get("link")
+            if not link:
+                continue
+            # Skipping here also saves the transcript extraction
+            if incremental and canonical_url(link) in seen:
+                known += 1
+                continue
+            tiktok_links.put(link)
+        if incremental:
+            logs.info(f"TikTok: {known} videos already judged")
+            inc("incremental_skipped_total", known, kind="tiktok")
+
+    def tiktok_transcript_stage():
+        tiktok_urls = list(drain(tiktok_links))
+        if tiktok_urls:
+            # Chunks finish in any order; remember where each video was discovered
+            link_order = {canonical_url(url): position for position, url in enumerate(tiktok_urls)}
+            extracted = 0
+            for transcript in iter_tiktok_transcripts(tiktok_urls):
+                tiktok["order"][transcript[0]] = link_order.get(canonical_url(transcript[0]), len(link_order))
+                tiktok_items.put(transcript)
+                extracted += 1
+            logs.info(f"Successfully extracted {extracted} TikTok transcripts")
+
+    def tiktok_summarize_stage():
+        #try batch process tiktok urls using gemini
+        for summarized in process_in_batches(
+                tiktok_items, GEMINI_BATCH_MAX_ITEMS,
+                lambda batch: batch_summarize_urls_with_gemini(brand, description, batch, on_result=emit_results,
+                                                               on_outcome=record("tiktok"), keywords=[keyword]),
+                GEMINI_MAX_IN_FLIGHT):
+            tiktok["summaries"].extend(summarized)
+
+    pipeline.stage("search", search_stage, outbox=search_results, error_prefix="Error searching")
+    pipeline.stage("dedup", dedup_stage, inbox=search_results, outbox=web_items,
+                   error_prefix="Error removing duplicates")
+    pipeline.stage("relevance", relevance_stage, inbox=web_items, outbox=relevant_items,
+                   error_prefix="Error filtering results")
+    pipeline.stage("web-summarize", web_summarize_stage, inbox=relevant_items,
+                   error_prefix="Error summarizing content")
+    pipeline.stage("tiktok-discovery", tiktok_discovery_stage, outbox=tiktok_links,
+                   error_prefix="Error searching TikTok")
+    pipeline.stage("tiktok-transcripts", tiktok_transcript_stage, inbox=tiktok_links, outbox=tiktok_items,
+                   error_prefix="Error extracting TikTok transcripts")
+    pipeline.stage("tiktok-summarize", tiktok_summarize_stage, inbox=tiktok_items,
+                   error_prefix="Error summarizing content")
+    pipeline.join()
+
+    api_errors = web["api_errors"] + pipeline.errors
+
+    # If we have no results and there were API errors, return error page
+    if not web["results"] and api_errors:
+        return {"results": {}, "api_errors": api_errors, "search_error": True}
+    if any(error.startswith("Error summarizing content") for error in pipeline.errors):
+        return {"results": {}, "api_errors": api_errors, "search_error": True}
+
+    # Batches finish in any order; put results back in search order, then TikTok
+    summarized = sorted(web["summaries"], key=lambda result: web["order"].get(result["url"], ()))
+    summarized.extend(sorted(tiktok["summaries"], key=lambda result: tiktok["order"].get(result["url"], 0)))
+    summarized = [mark(result) for result in summarized]
+    new_count = sum(1 for result in summarized if result["is_new"]) if seen else None
+
+    # Stored findings follow this run's results in each section
+    fresh = {canonical_url(result["url"]) for result in summarized}
+    summarized.extend(mark(result) for result in previous if canonical_url(result["url"]) not in fresh)
     
     # Group results by source
-    grouped_results = {
-        'reddit': [],
-        'youtube': [],
-        'x': [],
-        'google': [],
-        'facebook': [],
-        'trustpilot': [],
-        'google_reviews': [],
-        'tiktok': [],
-        'instagram': [],
-        'other': []
-    }
-    
+    grouped_results = {source: [] for source in SOURCE_GROUPS}
     for result in summarized:
-        source = result.get('source', 'google')
-        if source in grouped_results:
-            grouped_results[source].append(result)
-        else:
-            grouped_results['google'].append(result)
+        grouped_results[group_source(result.get('source', 'google'))].append(result)
 
+    # PDF rendering and the Drive upload happen on the export workers
+    export_id = None
     try:
-        generate_pdf(grouped_results, brand)
+        export_id = get_queue("exports").enqueue({"brand": brand, "results": grouped_results,
+                                                  "new_count": new_count})
     except Exception as e:
-        error_msg = f"Error generating PDF: {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        error_msg = f"Error queueing PDF export: {str(e)}"
+        logs.error(error_msg)
         api_errors.append(error_msg)
     
-    return render_template("results.html", results=grouped_results, brand=brand, 
-                          api_errors=api_errors if api_errors else None)
+    return {"results": grouped_results, "api_errors": api_errors, "search_error": False,
+            "new_count": new_count, "export_id": export_id}
 
 
-def generate_pdf(grouped_results, brand):
-    rendered_html = render_template('results.html', results=grouped_results, brand=brand)
-    
-    # Convert HTML to PDF
-    pdf_filename = brand
-    HTML(string=rendered_html).write_pdf(pdf_filename)
-
-    # Call upload function here
-    folder_id = FOLDER_ID
-    file_id = upload_to_folder(folder_id, pdf_filename)
-
-    os.remove(pdf_filename)  # Clean up the local file
-    print(f'PDF Uploaded {file_id}')
-    return f'PDF uploaded! File ID: {file_id}'
-
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+def generate_pdf(grouped_results, brand, new_count=None):
+    """Render the report to a uniquely named PDF in EXPORT_DIR and return its path."""
+    # WeasyPrint and its native libraries take a while to load; only export workers need them
+    from weasyprint import HTML
 
-
-def batch_summarize_urls(brand, description, url_snippet_pairs, batch_size=5):
-    """Process multiple URLs in batches to reduce API calls"""
+    # Exports run outside a request, on the export worker threads
+    with app.app_context():
+        rendered_html = render_template('results.html', results=grouped_results, brand=brand, new_count=new_count)
+    
+    # Convert HTML to PDF; the file name never depends on the brand, so concurrent runs cannot clash
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, pdf_path = tempfile.mkstemp(prefix="report-", suffix=".pdf", dir=EXPORT_DIR)
+    try:
+        with os.fdopen(fd, "wb") as pdf_file:
+            HTML(string=rendered_html).write_pdf(pdf_file)
+    except Exception:
+        os.remove(pdf_path)
+        raise
+    return pdf_path
+
+
+def _run_export_job(payload):
+    """Render a report's PDF (plus JSON when EXPORT_JSON is on) and upload it to Drive, retrying failures with backoff."""
+    brand = payload["brand"]
+    _remove_old_exports()
+
+    pdf_path = None
+    json_path = None
+    file_ids = {}
+    last_error = None
+    for attempt in range(1, EXPORT_MAX_ATTEMPTS + 1):
+        try:
+            if pdf_path is None:
+                with span("pdf_render"):
+                    pdf_path = generate_pdf(payload["results"], brand, payload.get("new_count"))
+            files = [(pdf_path, brand, "application/pdf")]
+            if EXPORT_JSON:
+                if json_path is None:
+                    json_path = os.path.splitext(pdf_path)[0] + ".json"
+                    with open(json_path, "w") as json_file:
+                        json.dump({"brand": brand, "results": payload["results"]}, json_file)
+                files.append((json_path, f"{brand}.json", "application/json"))
+
+            # Only retry the uploads that have not gone through yet
+            pending = [entry for entry in files if entry[0] not in file_ids]
+            for (path, _, _), file_id in zip(pending, upload_files_to_folder(FOLDER_ID, pending)):
+                if file_id is not None:
+                    file_ids[path] = file_id
+            if len(file_ids) < len(files):
+                raise RuntimeError("Drive upload returned no file ID")
+            logs.info(f"PDF uploaded as Drive file {file_ids[pdf_path]}")
+            inc("exports_total", outcome="ok")
+            return {"brand": brand, "pdf_path": pdf_path, "drive_file_id": file_ids[pdf_path], "drive_error": None}
+        except Exception as e:
+            last_error = e
+            logs.warning(f"PDF export attempt {attempt}/{EXPORT_MAX_ATTEMPTS} failed: {e}")
+            if attempt < EXPORT_MAX_ATTEMPTS:
+                time.sleep(2 ** attempt)
+
+    inc("exports_total", outcome="error" if pdf_path is None else "drive_error")
+    if pdf_path is None:
+        raise RuntimeError(f"Error generating PDF: {last_error}")
+    # The PDF itself is fine; keep it downloadable even though Drive refused it
+    return {"brand": brand, "pdf_path": pdf_path, "drive_file_id": file_ids.get(pdf_path),
+            "drive_error": str(last_error)}
+
+
+def _remove_old_exports():
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - EXPORT_RETENTION
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+# Progress of the reports running in this process, streamed by /jobs/<job_id>/events
+report_events = JobEvents()
+
+# Job queues by name: (handler, worker threads, JobEvents for the handler's progress).
+# Bulk runs get their own workers so a long list never delays a single report
+QUEUES = {
+    "reports": (_run_report_job, REPORT_WORKERS, report_events),
+    "bulk-reports": (_run_report_job, BULK_WORKERS, None),
+    "exports": (_run_export_job, EXPORT_WORKERS, None),
+}
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(name):
+    """Return the process-wide JobQueue `name`, opening it on first use. Its workers are not started."""
+    job_queue = _queues.get(name)
+    if job_queue is None:
+        with _queues_lock:
+            if name not in _queues:
+                handler, workers, events = QUEUES[name]
+                _queues[name] = JobQueue(name, handler, workers=workers, events=events)
+            job_queue = _queues[name]
+    return job_queue
+
+
+def start_workers(names=tuple(QUEUES)):
+    """
+    Start the workers of the named queues, picking up any jobs left queued by a previous run.
+
+    Importing this module starts nothing; the web server calls this for every queue and the
+    bulk CLI only for the queues it works on, so it never claims jobs submitted through the site.
+    """
+    for name in names:
+        get_queue(name).start()
+
+
+@app.route('/metrics')
+def metrics():
+    """Counters, histograms and span timings in the Prometheus text format."""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/exports/<export_id>')
+def export_status(export_id):
+    job = get_queue("exports").get(export_id)
+    if job is None:
+        return jsonify(error="Export not found"), 404
+    result = job["result"] or {}
+    return jsonify(export_id=job["id"], status=job["status"], error=job["error"],
+                   drive_file_id=result.get("drive_file_id"), drive_error=result.get("drive_error"),
+                   download_url=url_for('export_download', export_id=export_id) if result else None)
+
+
+@app.route('/exports/<export_id>/download')
+def export_download(export_id):
+    job = get_queue("exports").get(export_id)
+    if job is None:
+        return jsonify(error="Export not found"), 404
+    if job["status"] != "done":
+        return jsonify(export_id=export_id, status=job["status"], error=job["error"] or "Export has not finished yet"), 409
+    pdf_path = job["result"]["pdf_path"]
+    if not os.path.exists(pdf_path):
+        return jsonify(error="Export has expired"), 410
+    return send_file(pdf_path, mimetype="application/pdf", as_attachment=True,
+                     download_name=f"{job['result']['brand']}.pdf")
+
+
+def batch_summarize_urls(brand, description, url_snippet_pairs, batch_size=GEMINI_BATCH_MAX_ITEMS, on_result=None,
+                         on_outcome=None):
+    """
+    Process multiple URLs in batches to reduce API calls.
+
+    Calls are packed up to the shared token budget, with at most `batch_size` URLs each.
+
+    If given, `on_result(results)` is called with cached results first and then
+    with each batch's results as soon as that batch is parsed.
+
+    If given, `on_outcome(outcomes)` gets the same updates as (url, result) pairs
+    for every URL the model judged, with result None when it found nothing
+    negative; URLs the model never answered are left out.
+    """
     summarized = []
+
+    # Only URLs whose inputs changed since the last run go to Gemini
+    cache = get_summary_cache()
+    keys = [summary_key(brand, description, url, snippet, WEB_PROMPT_VERSION)
+            for url, snippet, _ in url_snippet_pairs]
+    cached = cache.get_many(keys)
+    pending = [item for item, key in zip(url_snippet_pairs, keys) if key not in cached]
+    produced = {}
+    logs.info(f"Summary cache: {len(url_snippet_pairs) - len(pending)} cached, "
+              f"{len(pending)} to summarize ({cache.stats()})")
+    inc("summary_cache_lookups_total", len(url_snippet_pairs) - len(pending), kind="web", outcome="hit")
+    inc("summary_cache_lookups_total", len(pending), kind="web", outcome="miss")
+    if on_result:
+        on_result([cached[key] for key in keys if cached.get(key)])
+    if on_outcome:
+        on_outcome([(item[0], cached[key]) for item, key in zip(url_snippet_pairs, keys) if key in cached])
     
-    # Process URLs in batches
-    for i in range(0, len(url_snippet_pairs), batch_size):
-        batch = url_snippet_pairs[i:i+batch_size]
-        print(f"[INFO] Processing batch {i//batch_size + 1} with {len(batch)} URLs")
-        
+    def build_prompt(numbered):
         # Create a combined prompt with all URLs and snippets in this batch
         combined_prompt = f"""
 You're analyzing content for negative mentions of the brand "{brand}". 
@@ -249,114 +720,73 @@ For each item, provide a clear summary of negative content or indicate if there
 IMPORTANT: 
 1. If the content is completely unrelated to the brand "{brand}" or doesn't mention it at all, 
    respond with "UNRELATED" for that item.
-2. For each item, identify the source platform of the URL as specifically as possible:
-   - Google (general search results)
-   - Google Reviews (specifically customer reviews on Google)
-   - Trustpilot (reviews from Trustpilot)
-   - Reddit
-   - YouTube
-   - X/Twitter
-   - TikTok
-   - Facebook
-   -Instagram
-   - Other (specify if possible)
-3. Pay special attention to review content from Google Reviews and Trustpilot, as these often contain valuable customer feedback.
-4. Use the business description to better understand the context and identify relevant negative mentions.
+2. Pay special attention to review content from Google Reviews and Trustpilot, as these often contain valuable customer feedback.
+3. Use the business description to better understand the context and identify relevant negative mentions.
 
 """
 
         # Add each URL and snippet to the prompt
-        for idx, (url, snippet, _) in enumerate(batch):
-            combined_prompt += f"\nITEM {idx+1}:\nURL: {url}\nContent: {snippet}\n"
+        for item_id, (url, snippet, _) in numbered:
+            combined_prompt += f"\nITEM {item_id}:\nURL: {url}\nContent: {truncate_to_tokens(snippet)}\n"
         
         combined_prompt += f"""
-For each item, provide a summary in this format:
-ITEM 1: 
-SOURCE: [Google/Google Reviews/Trustpilot/Reddit/YouTube/X/TikTok/Facebook/Instagram/Other]
-SUMMARY: [summary or 'No negative content' or 'UNRELATED']
-
-ITEM 2: 
-SOURCE: [Google/Google Reviews/Trustpilot/Reddit/YouTube/X/TikTok/Facebook/Instagram/Other]
-SUMMARY: [summary or 'No negative content' or 'UNRELATED']
-
-... and so on.
+Reply with a JSON array containing exactly one object per item, with these fields:
+- "id": the ITEM number, copied exactly
+- "summary": the summary, or 'No negative content', or 'UNRELATED'
 """
-        
-        try:
-            # Replace OpenAI API call with Gemini API call
-            result = call_gemini_api(combined_prompt)
+        return combined_prompt
+
+    # Send all batches to Gemini at once and record each reply as it arrives
+    for numbered, replies in iter_structured_batches(pending, build_prompt, max_items=batch_size):
+        batch_results = []
+        batch_outcomes = []
+        batch_cached = {}
+
+        for item_id, (url, snippet, _) in numbered:
+            summary_match = replies.get(item_id)
+            if summary_match is None:
+                continue
+            key = summary_key(brand, description, url, snippet, WEB_PROMPT_VERSION)
+            # Platform from the URL's host; sites of no known platform go under other
+            detected_source = url_source(url)
             
-            # Parse the results for each URL
-            items = result.split("ITEM ")[1:]  # Split by "ITEM " and remove the first empty element
-            
-            for idx, item_text in enumerate(items):
-                if idx < len(batch):
-                    url, snippet, original_source = batch[idx]
-                    
-                    # Extract source and summary from the item text
-                    source_match = None
-                    summary_match = None
-                    
-                    lines = item_text.split('\n')
-                    for i, line in enumerate(lines):
-                        if line.startswith("SOURCE:"):
-                            source_match = line.replace("SOURCE:", "").strip().lower()
-                        elif line.startswith("SUMMARY:"):
-                            # Get the summary (which might span multiple lines)
-                            summary_lines = []
-                            summary_lines.append(line.replace("SUMMARY:", "").strip())
-                            
-                            # Add any additional lines that are part of the summary
-                            for j in range(i+1, len(lines)):
-                                if not (lines[j].startswith("ITEM") or lines[j].startswith("SOURCE:")):
-                                    summary_lines.append(lines[j])
-                            
-                            summary_match = "\n".join(summary_lines)
-                            break
-                    
-                    # Use the detected source or fall back to the original source
-                    detected_source = source_match if source_match else original_source
-                    
-                    # Map the detected source to our categories
-                    if detected_source:
-                        if "reddit" in detected_source:
-                            detected_source = "reddit"
-                        elif "youtube" in detected_source:
-                            detected_source = "youtube"
-                        elif "x" in detected_source or "twitter" in detected_source:
-                            detected_source = "x"
-                        elif "tiktok" in detected_source:
-                            detected_source = "tiktok"
-                        elif "instagram" in detected_source:
-                            detected_source = "instagram"
-                        elif "facebook" in detected_source:
-                            detected_source = "facebook"
-                        elif "trustpilot" in detected_source:
-                            detected_source = "trustpilot"
-                        elif "google review" in detected_source:
-                            detected_source = "google_reviews"
-                        elif "google" in detected_source:
-                            detected_source = "google"
-                        else:
-                            detected_source = "other"  # Changed default to "other"
-                    
-                    # Skip unrelated content or content with no negative mentions
-                    if summary_match and not ("unrelated" in summary_match.lower() or "no negative content" in summary_match.lower()):
-                        print(f"[SUMMARY {i+idx+1}] Source: {detected_source}, Summary: {summary_match[:100]}...")
-                        summarized.append({
-                            "url": url, 
-                            "summary": summary_match, 
-                            "source": detected_source
-                        })
-                    else:
-                        print(f"[INFO] No relevant content found at: {url}")
-                        
-        except Exception as e:
-            print(f"[ERROR] Error processing batch: {e}")
+            # Skip unrelated content or content with no negative mentions
+            if summary_match and not ("unrelated" in summary_match.lower() or "no negative content" in summary_match.lower()):
+                logs.debug(f"Summary {item_id}: source {detected_source}, {summary_match[:100]}...", sampled=True)
+                produced[key] = {
+                    "url": url, 
+                    "summary": summary_match, 
+                    "source": detected_source
+                }
+                batch_cached[key] = produced[key]
+                batch_results.append(produced[key])
+                batch_outcomes.append((url, produced[key]))
+            else:
+                logs.info(f"No relevant content found at: {url}", sampled=True)
+                if summary_match:
+                    batch_cached[key] = None
+                    batch_outcomes.append((url, None))
+
+        cache.set_many(batch_cached)
+        if on_result:
+            on_result(batch_results)
+        if on_outcome:
+            on_outcome(batch_outcomes)
+
+    # Merge cached and fresh results back into input order
+    for key in keys:
+        result = cached.get(key) or produced.get(key)
+        if result:
+            summarized.append(result)
     
     return summarized
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        select_mode(sys.argv[1])
+    # With the debugger on, only the reloader's child process serves requests
+    if not debug_mode or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_workers()
     if mode == "production":
         app.run(debug=debug_mode, port=5000, host="0.0.0.0")
     else:
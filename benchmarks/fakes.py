@@ -0,0 +1,315 @@
+"""
+Offline stand-ins for Search1API, Apify, Gemini and Google Drive.
+
+Every fake replays the recorded responses in benchmarks/fixtures, waits for a
+configurable latency and fails a configurable share of calls. install() swaps
+them in underneath the real client code, so searchapi, tiktok,
+tiktok_transcript, call_gemini_api and upload_to_folder all run unchanged.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import types
+import zlib
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as fixture:
+        return json.load(fixture)
+
+
+def fill(template, brand, key):
+    """Substitute the brand and a stable per-result id into a recorded template."""
+    slug = re.sub(r"[^a-z0-9]+", "", brand.lower())
+    return (template.replace("{brand}", brand).replace("{slug}", slug)
+            .replace("{id}", str(7000000000000000000 + key)))
+
+
+def stable_hash(*parts):
+    return zlib.crc32("|".join(str(part) for part in parts).encode("utf-8"))
+
+
+class FakeServiceError(Exception):
+    """Injected failure; the 503 code makes the LLM scheduler retry it like a real overload."""
+    code = 503
+
+
+class Conditions:
+    """
+    Latency and failure settings for one fake service.
+
+    Args:
+        latency (float): Mean seconds per call
+        jitter (float): Standard deviation of the latency, in seconds
+        error_rate (float): Share of calls that raise FakeServiceError
+        per_token (float): Extra seconds per estimated prompt token (LLM only)
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, per_token=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.per_token = per_token
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, service, tokens=0):
+        """Sleep for one call's latency, then fail it if it was picked for an injected error."""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter)) + tokens * self.per_token
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+        if failed:
+            raise FakeServiceError(f"injected {service} failure")
+
+
+# ─── Search1API ───────────────────────────────────────────────────────────────
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class FakeSearch1APISession:
+    """
+    Replaces the requests.Session inside searchapi.Search1APIClient.
+
+    Each search returns up to `results_per_search` recorded results for its
+    service. Result ids are drawn from a pool of `url_pool` per brand, so
+    different queries overlap the way real searches do and dedup has work to do.
+    """
+
+    def __init__(self, conditions, brand="Acme", results_per_search=None, url_pool=400):
+        self.conditions = conditions
+        self.brand = brand
+        self.results_per_search = results_per_search
+        self.url_pool = url_pool
+        self.headers = {}
+        self.recorded = load_fixture("search1api.json")
+
+    def post(self, url, json=None, timeout=None):
+        service = json["search_service"]
+        self.conditions.call("search1api")
+        templates = self.recorded.get(service) or self.recorded["google"]
+        count = json["max_results"]
+        if self.results_per_search is not None:
+            count = min(count, self.results_per_search)
+        results = []
+        for i in range(count):
+            template = templates[i % len(templates)]
+            key = stable_hash(self.brand, json["query"], service, i) % self.url_pool
+            results.append({field: fill(value, self.brand, key) for field, value in template.items()})
+        return FakeResponse({"results": results})
+
+    def close(self):
+        pass
+
+
+# ─── Apify ────────────────────────────────────────────────────────────────────
+TIKTOK_SCRAPER_ACTOR = "clockworks/tiktok-scraper"
+
+
+class FakeApifyClient:
+    """
+    Replaces apify_client.ApifyClient for the TikTok search and transcript actors.
+
+    Actor runs store their items in an in-memory dataset that dataset(id)
+    iterates, mirroring the real call / defaultDatasetId / iterate_items flow.
+    """
+
+    def __init__(self, search_conditions, transcript_conditions, brand="Acme", video_pool=200):
+        self.search_conditions = search_conditions
+        self.transcript_conditions = transcript_conditions
+        self.brand = brand
+        self.video_pool = video_pool
+        self.search_items = load_fixture("tiktok_search.json")
+        self.transcripts = load_fixture("tiktok_transcripts.json")
+        self._datasets = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, token=None):
+        # Stands in for the ApifyClient class: every "new client" is this one
+        return self
+
+    def actor(self, actor_id):
+        return types.SimpleNamespace(call=lambda run_input: self._run(actor_id, run_input))
+
+    def dataset(self, dataset_id):
+        with self._lock:
+            items = self._datasets.pop(dataset_id)
+        return types.SimpleNamespace(iterate_items=lambda: iter(items))
+
+    def _run(self, actor_id, run_input):
+        if actor_id == TIKTOK_SCRAPER_ACTOR:
+            self.search_conditions.call("apify-tiktok-search")
+            items = []
+            for query in run_input["searchQueries"]:
+                for i in range(run_input["resultsPerPage"]):
+                    template = self.search_items[i % len(self.search_items)]
+                    key = stable_hash(self.brand, query, i) % self.video_pool
+                    items.append({field: fill(value, self.brand, key) for field, value in template.items()})
+        else:
+            self.transcript_conditions.call("apify-transcripts")
+            items = []
+            for url in run_input["videos"]:
+                transcript = self.transcripts[stable_hash(url) % len(self.transcripts)]
+                items.append({"url": url, "description": f"{self.brand} video",
+                              "transcript": "" if transcript == "No Transcript" else fill(transcript, self.brand, 0)})
+        with self._lock:
+            dataset_id = f"dataset-{len(self._datasets)}-{time.monotonic_ns()}"
+            self._datasets[dataset_id] = items
+        return {"defaultDatasetId": dataset_id}
+
+
+# ─── Gemini ───────────────────────────────────────────────────────────────────
+class FakeGenaiClient:
+    """
+    Replaces the google.genai client used by gemini.call_gemini_api.
+
+    Structured calls get a JSON reply with one object per ITEM in the prompt.
+    The verdicts follow the recorded negative / neutral / unrelated mix.
+    `miss_rate` of the items are left out so the re-query path is exercised.
+    Plain calls, used for TikTok keyword generation, get the recorded keyword list.
+    """
+
+    def __init__(self, conditions, brand="Acme", miss_rate=0.0):
+        self.conditions = conditions
+        self.brand = brand
+        self.miss_rate = miss_rate
+        self.recorded = load_fixture("gemini_summaries.json")
+        self.models = types.SimpleNamespace(generate_content=self.generate_content)
+
+    def generate_content(self, model, contents, config=None):
+        prompt_tokens = len(contents) // 4 + 1
+        self.conditions.call("gemini", prompt_tokens)
+        if config is None:
+            text = "\n".join(f"- {fill(keyword, self.brand, 0)}" for keyword in self.recorded["keywords"])
+        else:
+            replies = []
+            for item_id, url in re.findall(r"ITEM (\d+):\s*URL: (\S+)", contents):
+                verdict = stable_hash(url) % 1000 / 1000
+                if random.random() < self.miss_rate:
+                    continue
+                replies.append({"id": int(item_id), "summary": self._summary(url, verdict)})
+            text = json.dumps(replies)
+        usage = types.SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=len(text) // 4 + 1)
+        return types.SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _summary(self, url, verdict):
+        mix = self.recorded["mix"]
+        if verdict < mix["negative"]:
+            choices = self.recorded["negative"]
+        elif verdict < mix["negative"] + mix["neutral"]:
+            choices = self.recorded["neutral"]
+        else:
+            choices = self.recorded["unrelated"]
+        return fill(choices[stable_hash(url, "summary") % len(choices)], self.brand, 0)
+
+
+# ─── Google Drive ─────────────────────────────────────────────────────────────
+class FakeDriveService:
+    """Replaces the Drive v3 service returned by drive.get_drive_service."""
+
+    def __init__(self, conditions):
+        self.conditions = conditions
+        self.uploads = 0
+        self._lock = threading.Lock()
+
+    def files(self):
+        return types.SimpleNamespace(create=self._create)
+
+    def _create(self, body, media_body, fields):
+        def execute():
+            self.conditions.call("drive")
+            with self._lock:
+                self.uploads += 1
+                return {"id": f"fake-file-{self.uploads}"}
+        return types.SimpleNamespace(execute=execute)
+
+
+class Fakes:
+    """The installed fakes, so a benchmark can retarget them and read their call counts."""
+
+    def __init__(self, search, apify, gemini, drive):
+        self.search = search
+        self.apify = apify
+        self.gemini = gemini
+        self.drive = drive
+
+    def set_brand(self, brand):
+        self.search.brand = brand
+        self.apify.brand = brand
+        self.gemini.brand = brand
+
+    def stats(self):
+        conditions = {"search1api": self.search.conditions, "apify-search": self.apify.search_conditions,
+                      "apify-transcripts": self.apify.transcript_conditions,
+                      "gemini": self.gemini.conditions, "drive": self.drive.conditions}
+        return {name: {"calls": c.calls, "errors": c.errors} for name, c in conditions.items()}
+
+
+# Recorded latencies of the real services, in seconds; scaled by install(latency_scale=...)
+DEFAULT_LATENCY = {
+    "search1api": (0.6, 0.2),
+    "apify-search": (20.0, 5.0),
+    "apify-transcripts": (12.0, 3.0),
+    "gemini": (1.5, 0.4),
+    "drive": (0.8, 0.2),
+}
+GEMINI_SECONDS_PER_TOKEN = 0.0002
+
+
+def install(latency_scale=1.0, error_rate=0.0, miss_rate=0.0, results_per_search=None, url_pool=400,
+            seed=0):
+    """
+    Swap the fakes in underneath searchapi, tiktok, tiktok_transcript, gemini and drive.
+
+    Call before the first report runs; importing app first is fine.
+
+    Returns:
+        Fakes: the installed fakes
+    """
+    def conditions(name, index):
+        latency, jitter = DEFAULT_LATENCY[name]
+        return Conditions(latency * latency_scale, jitter * latency_scale, error_rate,
+                          GEMINI_SECONDS_PER_TOKEN * latency_scale if name == "gemini" else 0.0,
+                          seed=seed + index)
+
+    import drive
+    import gemini
+    import searchapi
+    import tiktok
+
+    search = FakeSearch1APISession(conditions("search1api", 0), results_per_search=results_per_search,
+                                   url_pool=url_pool)
+    searchapi.get_client().session = search
+
+    apify = FakeApifyClient(conditions("apify-search", 1), conditions("apify-transcripts", 2))
+    sys.modules["apify_client"] = types.SimpleNamespace(ApifyClient=apify)
+    tiktok._apify_client = apify
+    os.environ.setdefault("APIFY_API_TOKEN", "offline")
+
+    llm = FakeGenaiClient(conditions("gemini", 3), miss_rate=miss_rate)
+    gemini._client = llm
+    os.environ.setdefault("GEMINI_API_KEY", "offline")
+
+    drive_service = FakeDriveService(conditions("drive", 4))
+    drive.get_drive_service = lambda: drive_service
+
+    return Fakes(search, apify, llm, drive_service)
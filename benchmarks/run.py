@@ -0,0 +1,235 @@
+"""
+Offline pipeline benchmarks.
+
+Replays the recorded fixtures through the fakes in benchmarks/fakes.py and runs
+each scenario several times. "search" scenarios go end to end: POST /search,
+then poll the report job until it finishes. "summarize" scenarios call the two
+summarizers directly with a fixed number of items. Every iteration uses a new
+brand, so caches start cold unless --warm is given.
+
+Reports throughput, p50/p95 wall time per iteration, p50/p95 of the
+instrumented external calls, and peak traced memory.
+
+Usage:
+    python benchmarks/run.py [--scenarios search-5kw,summarize-web-200] [--iterations 3]
+                             [--latency-scale 0.1] [--error-rate 0.05] [--miss-rate 0.05]
+                             [--warm] [--no-memory] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# (name, kind, parameters); keyword counts and URL volumes bracket real reports
+SCENARIOS = [
+    ("search-1kw", "search", {"keywords": 1, "results_per_search": 10}),
+    ("search-5kw", "search", {"keywords": 5, "results_per_search": 20}),
+    ("search-26kw", "search", {"keywords": 26, "results_per_search": 20}),
+    ("summarize-web-50", "summarize-web", {"items": 50}),
+    ("summarize-web-200", "summarize-web", {"items": 200}),
+    ("summarize-web-1000", "summarize-web", {"items": 1000}),
+    ("summarize-tiktok-20", "summarize-tiktok", {"items": 20}),
+    ("summarize-tiktok-100", "summarize-tiktok", {"items": 100}),
+]
+# Instrumented calls whose latency is reported per scenario
+CALL_SPANS = ["search1api", "tiktok_search", "transcript_chunk", "gemini_call", "drive_upload", "pdf_render"]
+JOB_TIMEOUT = 900  # seconds to wait for one report job
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def prepare_environment(scratch):
+    """Point every cache, queue and export at `scratch` and quiet the logs; must run before importing app."""
+    os.environ.update({
+        "JOBS_DB_PATH": os.path.join(scratch, "jobs.sqlite3"),
+        "SEARCH_CACHE_PATH": os.path.join(scratch, "search_cache.sqlite3"),
+        "SUMMARY_CACHE_PATH": os.path.join(scratch, "summary_cache.sqlite3"),
+        "TRANSCRIPT_CACHE_PATH": os.path.join(scratch, "transcript_cache.sqlite3"),
+        "FINDINGS_DB_PATH": os.path.join(scratch, "findings.sqlite3"),
+        "QUERY_PLAN_DB_PATH": os.path.join(scratch, "query_plan.sqlite3"),
+        "EXPORT_DIR": os.path.join(scratch, "exports"),
+        "METRICS_SPAN_BUFFER": "200000",
+        "LOG_LEVEL": "WARNING",
+        "SEARCH1_API_KEY": "offline",
+        "DRIVE_FOLDER_ID": "offline",
+    })
+    sys.path.insert(0, REPO_DIR)
+
+
+def run_search(app_module, client, brand, params):
+    """Submit one report through POST /search and wait for its job; returns the number of results."""
+    app_module.NEGATIVE_KEYWORDS = app_module.PRODUCTION_KEYWORDS[:params["keywords"]]
+    response = client.post("/search", headers={"Accept": "application/json"}, data={
+        "brand": brand, "website": "example.com", "description": "Amazon FBA coaching program",
+        "keyword": "review"})
+    job_id = response.get_json()["job_id"]
+
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while time.monotonic() < deadline:
+        status = client.get(f"/jobs/{job_id}").get_json()["status"]
+        if status in ("done", "failed"):
+            break
+        time.sleep(0.02)
+    else:
+        raise RuntimeError(f"report job {job_id} did not finish in {JOB_TIMEOUT}s")
+
+    report = client.get(f"/jobs/{job_id}/result?format=json").get_json()
+    return sum(len(results) for results in report["results"].values()), report.get("export_id")
+
+
+def wait_for_export(client, export_id):
+    """Wait for a report's PDF export, so it neither overlaps the next iteration nor outlives the scratch dir."""
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while time.monotonic() < deadline:
+        if client.get(f"/exports/{export_id}").get_json()["status"] in ("done", "failed"):
+            return
+        time.sleep(0.02)
+    raise RuntimeError(f"export job {export_id} did not finish in {JOB_TIMEOUT}s")
+
+
+def run_summarize(app_module, gemini_module, kind, brand, params):
+    """Summarize a fixed batch of recorded-looking items; returns the number of results."""
+    description = "Amazon FBA coaching program"
+    if kind == "summarize-web":
+        items = [(f"https://www.reddit.com/r/AmazonSeller/comments/{brand.replace(' ', '')}{i}/",
+                  f"Lost money with {brand}, the coaching was generic and support never answered ({i}).",
+                  "reddit")
+                 for i in range(params["items"])]
+        return len(app_module.batch_summarize_urls(brand, description, items))
+    items = [(f"https://www.tiktok.com/@seller/video/{7100000000000000000 + i}",
+              f"{brand} review #fba",
+              f"I tried {brand} for three months. The calls were fine but the refund took forever. " * 20)
+             for i in range(params["items"])]
+    return len(gemini_module.batch_summarize_urls_with_gemini(brand, description, items))
+
+
+def run_scenario(name, kind, params, iterations, fakes, warm, trace_memory):
+    import app as app_module
+    import gemini as gemini_module
+    from metrics import recent_spans
+
+    client = app_module.app.test_client()
+    fakes.search.results_per_search = params.get("results_per_search")
+    walls, counts = [], []
+    peak_bytes = 0
+    before = fakes.stats()
+    started_at = time.time()
+
+    for iteration in range(iterations):
+        brand = f"Benchbrand {name} {0 if warm else iteration}"
+        fakes.set_brand(brand)
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        export_id = None
+        if kind == "search":
+            count, export_id = run_search(app_module, client, brand, params)
+            counts.append(count)
+        else:
+            counts.append(run_summarize(app_module, gemini_module, kind, brand, params))
+        walls.append(time.perf_counter() - start)
+        if trace_memory:
+            peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        if export_id:
+            wait_for_export(client, export_id)
+
+    after = fakes.stats()
+    calls = {}
+    for span_name in CALL_SPANS:
+        durations = [s["duration"] for s in recent_spans(span_name, limit=10 ** 9) if s["start"] >= started_at]
+        if durations:
+            calls[span_name] = {"count": len(durations), "p50": percentile(durations, 50),
+                                "p95": percentile(durations, 95)}
+
+    total_wall = sum(walls)
+    return {
+        "scenario": name,
+        "kind": kind,
+        "params": params,
+        "iterations": iterations,
+        "results_per_iteration": counts,
+        "throughput_per_s": (sum(counts) / total_wall) if total_wall else 0.0,
+        "iterations_per_min": (60 * iterations / total_wall) if total_wall else 0.0,
+        "wall_p50": percentile(walls, 50),
+        "wall_p95": percentile(walls, 95),
+        "peak_memory_mb": peak_bytes / 2 ** 20 if trace_memory else None,
+        "calls": calls,
+        "fake_calls": {service: {"calls": after[service]["calls"] - before[service]["calls"],
+                                 "errors": after[service]["errors"] - before[service]["errors"]}
+                       for service in after},
+    }
+
+
+def print_report(results):
+    print(f"{'scenario':<24}{'iters':>6}{'results/s':>11}{'iters/min':>11}"
+          f"{'p50 s':>9}{'p95 s':>9}{'peak MB':>9}")
+    for result in results:
+        memory = f"{result['peak_memory_mb']:.1f}" if result["peak_memory_mb"] is not None else "-"
+        print(f"{result['scenario']:<24}{result['iterations']:>6}{result['throughput_per_s']:>11.1f}"
+              f"{result['iterations_per_min']:>11.1f}{result['wall_p50']:>9.2f}{result['wall_p95']:>9.2f}"
+              f"{memory:>9}")
+        for span_name, stats in result["calls"].items():
+            print(f"    {span_name:<20} n={stats['count']:<6} p50={stats['p50'] * 1000:8.1f} ms  "
+                  f"p95={stats['p95'] * 1000:8.1f} ms")
+        injected = {service: counts for service, counts in result["fake_calls"].items() if counts["errors"]}
+        if injected:
+            print(f"    injected errors: {injected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks")
+    parser.add_argument("--scenarios", default=",".join(name for name, _, _ in SCENARIOS),
+                        help="comma-separated scenario names")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiplier on the recorded service latencies (0 for no waiting)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake calls that fail")
+    parser.add_argument("--miss-rate", type=float, default=0.0,
+                        help="share of items the fake LLM leaves out of its replies")
+    parser.add_argument("--warm", action="store_true", help="reuse one brand so caches are warm after the first run")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, which slows the run down")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    selected = args.scenarios.split(",")
+    unknown = set(selected) - {name for name, _, _ in SCENARIOS}
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        prepare_environment(scratch)
+        import fakes as fakes_module
+        import app
+        app.start_workers()  # the search scenarios go through the report queue
+        fakes = fakes_module.install(latency_scale=args.latency_scale, error_rate=args.error_rate,
+                                     miss_rate=args.miss_rate)
+
+        results = []
+        for name, kind, params in SCENARIOS:
+            if name in selected:
+                results.append(run_scenario(name, kind, params, args.iterations, fakes,
+                                            args.warm, not args.no_memory))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Measure how long a fresh worker takes to import the app.
+
+Runs `python -X importtime -c "import app"` in new interpreters and reports the
+median wall time, the modules with the largest cumulative import time, and any
+heavy dependency that is loaded at import when it should be lazy.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--top 15] [--module app] [--max-seconds 1.0]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies that only specific stages need; none of them should load with the app
+LAZY_MODULES = ["weasyprint", "openai", "google.genai", "apify_client", "googleapiclient", "bs4"]
+
+
+def run_once(module, env):
+    """Import `module` in a fresh interpreter; return (wall seconds, {module: (self_us, cumulative_us)})."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        # import time:       self [us] |  cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            timings[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return wall, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="exit non-zero when the median import time is above this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        # Keep the job queues and caches the app opens at import away from real data
+        env = dict(os.environ,
+                   JOBS_DB_PATH=os.path.join(scratch, "jobs.sqlite3"),
+                   EXPORT_DIR=os.path.join(scratch, "exports"))
+        runs = [run_once(args.module, env) for _ in range(args.runs)]
+
+    walls = [wall for wall, _ in runs]
+    imports = [timings[args.module][1] / 1e6 for _, timings in runs if args.module in timings]
+    median_import = statistics.median(imports) if imports else 0.0
+    print(f"[INFO] {args.runs} runs of 'import {args.module}'")
+    print(f"[INFO] Wall time: median {statistics.median(walls):.3f}s, "
+          f"min {min(walls):.3f}s, max {max(walls):.3f}s (includes interpreter start)")
+    print(f"[INFO] Import time: median {median_import:.3f}s")
+
+    # Average each module's cumulative time over the runs it appeared in
+    cumulative = {}
+    for _, timings in runs:
+        for name, (_, cumulative_us) in timings.items():
+            cumulative.setdefault(name, []).append(cumulative_us)
+    slowest = sorted(cumulative.items(), key=lambda item: statistics.mean(item[1]), reverse=True)
+    print(f"\nSlowest {args.top} imports (cumulative):")
+    for name, values in slowest[:args.top]:
+        print(f"  {statistics.mean(values) / 1000:9.1f} ms  {name}")
+
+    loaded = [name for name in LAZY_MODULES if name in cumulative]
+    if loaded:
+        print(f"\n[WARNING] Loaded at import but should be lazy: {', '.join(loaded)}")
+
+    if args.max_seconds is not None and median_import > args.max_seconds:
+        print(f"[ERROR] Median import time {median_import:.3f}s is above {args.max_seconds:.3f}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
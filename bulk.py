@@ -0,0 +1,191 @@
+"""
+Bulk reports: many brands scheduled through the shared search, TikTok and LLM pools.
+
+The brand list is CSV with a header row (brand, website, description, keyword
+and optionally force_refresh and incremental) or JSON (a list of objects with the same keys, or
+{"brands": [...]}). POST /bulk accepts either; this module's CLI reads a file,
+waits for every report and writes one JSON report and PDF per brand:
+
+    python bulk.py brands.csv --out reports/
+    python bulk.py --resume <bulk_id> --out reports/
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+import logs
+
+BULK_MAX_BRANDS = int(os.getenv("BULK_MAX_BRANDS", "500"))  # brands accepted in one bulk request
+BULK_POLL_INTERVAL = 2.0  # seconds between progress checks in the CLI
+REQUIRED_FIELDS = ("brand", "keyword")
+OPTIONAL_FIELDS = ("website", "description")
+FLAG_FIELDS = ("force_refresh", "incremental")
+
+
+def parse_brands(text, fmt=None):
+    """
+    Parse a CSV or JSON brand list into report payloads.
+
+    Args:
+        text (str): The file contents
+        fmt (str): "csv" or "json"; guessed from the first character when None
+
+    Returns:
+        list: dicts with brand, website, description, keyword, force_refresh and incremental
+
+    Raises:
+        ValueError: When the list is empty or too long, or a row lacks a brand or keyword or has too many fields
+    """
+    text = text.lstrip("\ufeff")
+    if fmt is None:
+        fmt = "json" if text.lstrip()[:1] in ("[", "{") else "csv"
+
+    if fmt == "json":
+        rows = json.loads(text)
+        if isinstance(rows, dict):
+            rows = rows.get("brands")
+        if not isinstance(rows, list):
+            raise ValueError("JSON brand list must be a list or {\"brands\": [...]}")
+    else:
+        rows = []
+        for number, row in enumerate(csv.DictReader(io.StringIO(text)), start=1):
+            # DictReader puts the fields past the header's last column in a list under None
+            if None in row:
+                raise ValueError(f"Row {number} has too many fields")
+            rows.append({(key or "").strip().lower(): (value or "").strip() for key, value in row.items()})
+
+    payloads = []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise ValueError(f"Row {number} is not an object")
+        missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or "").strip()]
+        if missing:
+            raise ValueError(f"Row {number} is missing {', '.join(missing)}")
+        payload = {field: str(row.get(field) or "").strip() for field in REQUIRED_FIELDS + OPTIONAL_FIELDS}
+        for flag in FLAG_FIELDS:
+            payload[flag] = str(row.get(flag, "")).strip().lower() in ("1", "true", "yes", "on")
+        payloads.append(payload)
+
+    if not payloads:
+        raise ValueError("The brand list is empty")
+    if len(payloads) > BULK_MAX_BRANDS:
+        raise ValueError(f"At most {BULK_MAX_BRANDS} brands per bulk request, got {len(payloads)}")
+    return payloads
+
+
+def new_bulk_id():
+    return uuid.uuid4().hex
+
+
+def summarize_jobs(jobs):
+    """Per-status counts and per-brand rows for a bulk group's jobs."""
+    counts = {}
+    brands = []
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+        result = job["result"] or {}
+        brands.append({"brand": job["payload"]["brand"], "job_id": job["id"], "status": job["status"],
+                       "error": job["error"], "export_id": result.get("export_id")})
+    return {"total": len(jobs), "counts": counts, "brands": brands,
+            "finished": all(job["status"] in ("done", "failed") for job in jobs)}
+
+
+def _file_slug(brand, used):
+    slug = re.sub(r"[^a-z0-9]+", "-", brand.lower()).strip("-") or "brand"
+    candidate = slug
+    index = 2
+    while candidate in used:
+        candidate = f"{slug}-{index}"
+        index += 1
+    used.add(candidate)
+    return candidate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate reports for many brands at once")
+    parser.add_argument("brands", nargs="?", help="CSV or JSON brand list")
+    parser.add_argument("--out", default="reports", help="directory for the per-brand reports")
+    parser.add_argument("--resume", help="wait for an existing bulk run instead of starting one")
+    parser.add_argument("--force-refresh", action="store_true", help="bypass cached search results")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only summarize URLs not judged by an earlier run for the same brand")
+    parser.add_argument("--search-budget", type=int,
+                        help="most web searches per brand (default QUERY_PLAN_BUDGET, 0 for no cap)")
+    parser.add_argument("--export-timeout", type=float, default=600,
+                        help="seconds to wait for each brand's PDF after its report is done")
+    args = parser.parse_args()
+    if not args.brands and not args.resume:
+        parser.error("give a brand list or --resume")
+
+    # Only this run's queues get workers here; single reports stay with the web server
+    from app import get_queue, start_workers
+    bulk_queue = get_queue("bulk-reports")
+    export_queue = get_queue("exports")
+    start_workers(("bulk-reports", "exports"))
+
+    if args.resume:
+        bulk_id = args.resume
+    else:
+        with open(args.brands, encoding="utf-8") as brand_file:
+            payloads = parse_brands(brand_file.read(),
+                                    "json" if args.brands.lower().endswith(".json") else None)
+        for payload in payloads:
+            payload["force_refresh"] = payload["force_refresh"] or args.force_refresh
+            payload["incremental"] = payload["incremental"] or args.incremental
+            if args.search_budget is not None:
+                payload["search_budget"] = args.search_budget
+        bulk_id = new_bulk_id()
+        bulk_queue.enqueue_many(payloads, group=bulk_id)
+        logs.info(f"Bulk run {bulk_id}: queued {len(payloads)} brands")
+
+    started = time.monotonic()
+    while True:
+        jobs = bulk_queue.get_group(bulk_id)
+        if not jobs:
+            logs.error(f"No bulk run with ID {bulk_id}")
+            return 1
+        summary = summarize_jobs(jobs)
+        logs.info(f"{time.monotonic() - started:.0f}s: {summary['counts']}")
+        if summary["finished"]:
+            break
+        time.sleep(BULK_POLL_INTERVAL)
+
+    os.makedirs(args.out, exist_ok=True)
+    used = set()
+    failed = 0
+    for job in jobs:
+        brand = job["payload"]["brand"]
+        slug = _file_slug(brand, used)
+        if job["status"] != "done":
+            failed += 1
+            logs.error(f"{brand}: {job['error']}")
+            continue
+        with open(os.path.join(args.out, f"{slug}.json"), "w", encoding="utf-8") as report_file:
+            json.dump({"brand": brand, **job["result"]}, report_file, indent=2)
+
+        # The export workers render (and upload) each PDF; copy it next to the JSON
+        export_id = job["result"].get("export_id")
+        deadline = time.monotonic() + args.export_timeout
+        export = export_queue.get(export_id) if export_id else None
+        while export is not None and export["status"] not in ("done", "failed") and time.monotonic() < deadline:
+            time.sleep(BULK_POLL_INTERVAL)
+            export = export_queue.get(export_id)
+        pdf_path = ((export or {}).get("result") or {}).get("pdf_path")
+        if pdf_path and os.path.exists(pdf_path):
+            shutil.copyfile(pdf_path, os.path.join(args.out, f"{slug}.pdf"))
+        else:
+            logs.warning(f"{brand}: no PDF ({(export or {}).get('error') or 'export not finished'})")
+
+    logs.info(f"Bulk run {bulk_id} finished in {time.monotonic() - started:.0f}s: "
+              f"{len(jobs) - failed} reports written to {args.out}, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "igshid", "igsh", "si", "ref", "ref_src", "ref_url",
+    "is_from_webapp", "sender_device", "sender_web_id", "is_copy_url", "share_app_id",
+    "share_item_id", "share_link_id", "social_sharing", "feature", "_r", "_t", "mc_cid", "mc_eid",
+}
+TRACKING_PREFIXES = ("utm_", "share_")
+
+# Host prefixes that serve the same content as the bare domain
+HOST_PREFIXES = ("www.", "m.", "mobile.", "old.", "new.", "np.", "amp.", "vm.", "vt.")
+
+# Hosts whose pages go in one report section (see app.SOURCE_GROUPS); subdomains match too
+SOURCE_HOSTS = {
+    "trustpilot.com": "trustpilot",
+    "reddit.com": "reddit",
+    "redd.it": "reddit",
+    "tiktok.com": "tiktok",
+    "instagram.com": "instagram",
+    "instagr.am": "instagram",
+    "facebook.com": "facebook",
+    "fb.com": "facebook",
+    "fb.watch": "facebook",
+    "x.com": "x",
+    "twitter.com": "x",
+    "t.co": "x",
+    "youtube.com": "youtube",
+    "youtu.be": "youtube",
+    "youtube-nocookie.com": "youtube",
+    "g.page": "google_reviews",
+    "maps.app.goo.gl": "google_reviews",
+}
+# Google Maps pages, where Google reviews live, on any country domain
+GOOGLE_REVIEWS_PATHS = ("/maps", "/local/reviews")
+
+_TIKTOK_VIDEO_RE = re.compile(r"/(?:video|v)/(\d+)")
+_REDDIT_POST_RE = re.compile(r"/comments/([a-z0-9]+)", re.IGNORECASE)
+_YOUTUBE_PATH_RE = re.compile(r"^/(?:shorts|embed|live|v)/([A-Za-z0-9_-]{11})")
+_WORD_RE = re.compile(r"\w+")
+_GOOGLE_HOST_RE = re.compile(r"^(?:(maps|search)\.)?google\.(?:com?\.)?[a-z]{2,3}$")
+
+
+def _split(url):
+    """urlsplit, or None for a URL it rejects (search results are untrusted, e.g. "http://[bad")."""
+    try:
+        return urlsplit(url or "")
+    except ValueError:
+        return None
+
+
+def _host(parts):
+    host = (parts.hostname or "").lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    return host
+
+
+def tiktok_video_id(url):
+    """Numeric ID of a TikTok video URL, or None."""
+    match = _TIKTOK_VIDEO_RE.search(url or "")
+    return match.group(1) if match else None
+
+
+def reddit_post_id(url):
+    """Base-36 ID of a Reddit thread from reddit.com/.../comments/<id> or redd.it/<id>, or None."""
+    parts = _split(url)
+    if parts is None:
+        return None
+    host = _host(parts)
+    if host == "redd.it":
+        post_id = parts.path.strip("/").split("/")[0]
+        return post_id.lower() or None
+    if host.endswith("reddit.com"):
+        match = _REDDIT_POST_RE.search(parts.path)
+        return match.group(1).lower() if match else None
+    return None
+
+
+def youtube_video_id(url):
+    """11-character YouTube video ID from watch, youtu.be, shorts or embed URLs, or None."""
+    parts = _split(url)
+    if parts is None:
+        return None
+    host = _host(parts)
+    if host == "youtu.be":
+        video_id = parts.path.strip("/").split("/")[0]
+        return video_id or None
+    if host.endswith("youtube.com") or host.endswith("youtube-nocookie.com"):
+        if parts.path == "/watch":
+            return dict(parse_qsl(parts.query)).get("v")
+        match = _YOUTUBE_PATH_RE.match(parts.path)
+        return match.group(1) if match else None
+    return None
+
+
+def url_source(url, default="other"):
+    """
+    Report section for a URL, from its host alone.
+
+    Hosts in SOURCE_HOSTS (and their subdomains) map to their platform and
+    Google Maps pages to google_reviews; anything else, such as box.com, gets `default`.
+    """
+    parts = _split(url)
+    if parts is None:
+        return default
+    host = _host(parts)
+    google = _GOOGLE_HOST_RE.match(host)
+    if google and (google.group(1) == "maps" or parts.path.startswith(GOOGLE_REVIEWS_PATHS)):
+        return "google_reviews"
+    labels = host.split(".")
+    for start in range(len(labels) - 1):
+        source = SOURCE_HOSTS.get(".".join(labels[start:]))
+        if source:
+            return source
+    return default
+
+
+def canonical_url(url):
+    """
+    Key under which two URLs for the same content compare equal.
+
+    TikTok videos, Reddit threads and YouTube videos reduce to their platform
+    ID. Any other URL loses its scheme, www./mobile host prefix, trailing
+    slash, fragment and tracking parameters, and the remaining parameters are
+    sorted. A URL that cannot be parsed is its own key, stripped of whitespace.
+    """
+    if not url:
+        return url
+    video_id = tiktok_video_id(url)
+    if video_id and "tiktok" in url.lower():
+        return f"tiktok:{video_id}"
+    post_id = reddit_post_id(url)
+    if post_id:
+        return f"reddit:{post_id}"
+    video_id = youtube_video_id(url)
+    if video_id:
+        return f"youtube:{video_id}"
+
+    parts = _split(url.strip())
+    if parts is None:
+        return url.strip()
+    params = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                    if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES))
+    path = parts.path.rstrip("/")
+    canonical = f"{_host(parts)}{path}"
+    if params:
+        canonical += "?" + urlencode(params)
+    return canonical
+
+
+def simhash(text, shingle_size=3):
+    """64-bit SimHash of `text` over word shingles."""
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class NearDuplicateIndex:
+    """
+    Finds snippets whose SimHash is within `max_distance` bits of one seen before.
+
+    Fingerprints are split into max_distance + 1 bands; two fingerprints that
+    close must agree exactly on at least one band, so only items sharing a band
+    are compared instead of every pair.
+    """
+
+    def __init__(self, max_distance=3, min_words=8):
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self._buckets = [{} for _ in range(self.bands)]
+
+    def _band_values(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def add(self, text):
+        """
+        Record `text` and return True if it nearly duplicates something already recorded.
+        Texts shorter than `min_words` words are never treated as duplicates.
+        """
+        if len(_WORD_RE.findall(text or "")) < self.min_words:
+            return False
+        fingerprint = simhash(text)
+        band_values = self._band_values(fingerprint)
+        for band, value in enumerate(band_values):
+            for other in self._buckets[band].get(value, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return True
+        for band, value in enumerate(band_values):
+            self._buckets[band].setdefault(value, []).append(fingerprint)
+        return False
@@ -1,35 +1,104 @@
 import os
-import google.auth
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from metrics import inc, span
+import logs
 
+DRIVE_UPLOAD_WORKERS = int(os.getenv("DRIVE_UPLOAD_WORKERS", "4"))
 
-def upload_to_folder(folder_id, file_name):
-    """Upload a file to the specified folder and return the file ID."""
-    try:
-        # Use the API key from environment variables
-        creds, _ = google.auth.default()
+# Credentials and the discovery document are loaded once per process. The
+# service object itself wraps an httplib2 connection, which is not thread-safe,
+# so each thread builds its own from the cached pieces. The Google client
+# libraries are imported on first use to keep app startup fast.
+_creds = None
+_discovery_doc = None
+_init_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_credentials():
+    """Return the process-wide Google credentials, refreshing the token when it has expired."""
+    global _creds
+    import google.auth
+    from google.auth.transport.requests import Request
+    with _init_lock:
+        if _creds is None:
+            # Use the credentials from GOOGLE_APPLICATION_CREDENTIALS
+            _creds, _ = google.auth.default()
+        if not _creds.valid:
+            _creds.refresh(Request())
+        return _creds
+
+
+def get_drive_service():
+    """Return this thread's Drive API client, building it from the cached credentials on first use."""
+    global _discovery_doc
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    creds = get_credentials()
+    service = getattr(_local, "service", None)
+    if service is None:
+        with _init_lock:
+            if _discovery_doc is None:
+                _discovery_doc = json.loads(get_static_doc("drive", "v3"))
+        service = build_from_document(_discovery_doc, credentials=creds)
+        _local.service = service
+    return service
+
+
+def upload_to_folder(folder_id, file_name, upload_name=None, mimetype="application/pdf"):
+    """
+    Upload a file to the specified folder and return the file ID.
 
-        # Create Drive API client
-        service = build("drive", "v3", credentials=creds)
+    `file_name` is the local path; the Drive file is named after `upload_name`
+    (defaulting to `file_name`) with the current date appended.
+    """
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaFileUpload
+    try:
+        service = get_drive_service()
         
         # Add date to the filename
         current_date = datetime.now().strftime("%Y-%m-%d")
-        file_name_with_date = f"{file_name}_{current_date}"
+        file_name_with_date = f"{upload_name or file_name}_{current_date}"
         
         # Create file metadata with the date-included filename and folder ID
         file_metadata = {"name": file_name_with_date, "parents": [folder_id]}
         
-        # Create media with the PDF file and appropriate mimetype
-        media = MediaFileUpload(file_name, mimetype="application/pdf", resumable=True)
+        # Create media with the file and appropriate mimetype
+        media = MediaFileUpload(file_name, mimetype=mimetype, resumable=True)
 
-        file = service.files().create(body=file_metadata, media_body=media, fields="id").execute()
-        print(f'File ID: "{file.get("id")}".')
-        print(f'Uploaded as: "{file_name_with_date}"')
+        with span("drive_upload", mimetype=mimetype):
+            file = service.files().create(body=file_metadata, media_body=media, fields="id").execute()
+        logs.info(f'Uploaded "{file_name_with_date}" as Drive file {file.get("id")}')
+        inc("drive_uploads_total", outcome="ok")
         return file.get("id")
                 
     except HttpError as error:
-        print(f"An error occurred: {error}")
+        logs.error(f"Drive upload of {file_name} failed: {error}")
+        inc("drive_uploads_total", outcome="error")
         return None
+
+
+def upload_files_to_folder(folder_id, files, max_workers=DRIVE_UPLOAD_WORKERS):
+    """
+    Upload several files to the same folder concurrently, reusing the cached credentials.
+
+    Args:
+        folder_id (str): Drive folder to upload into
+        files (list): (local_path, upload_name, mimetype) tuples; upload_name and
+            mimetype may be None to use the path and "application/pdf"
+
+    Returns:
+        list: File IDs in the order of `files`, with None for failed uploads
+    """
+    def upload_one(entry):
+        local_path, upload_name, mimetype = entry
+        return upload_to_folder(folder_id, local_path, upload_name, mimetype or "application/pdf")
+
+    if not files:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(files)), thread_name_prefix="drive") as executor:
+        return list(executor.map(upload_one, files))
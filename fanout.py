@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from metrics import inc, observe
+import logs
+
+SEARCH_GLOBAL_CONCURRENCY = int(os.getenv("SEARCH_GLOBAL_CONCURRENCY", "32"))  # searches in flight across all reports
+
+# Shared by every fan-out in the process, so concurrent reports queue for the same search capacity
+_search_slots = threading.BoundedSemaphore(SEARCH_GLOBAL_CONCURRENCY)
+
+
+def fan_out_search(queries, engines, max_results, max_workers=16, deadline=None, on_results=None, pairs=None):
+    """
+    Run every (query, engine) pair, or just the given `pairs`, at once on a bounded thread pool.
+
+    Args:
+        queries (list): Search queries, in the order results should be merged
+        engines (list): (source, search_fn) tuples, in the order results should be merged
+        max_results (int): Passed through to every search function
+        max_workers (int): Maximum number of this fan-out's searches in flight at the same time;
+            all fan-outs together are also capped at SEARCH_GLOBAL_CONCURRENCY
+        deadline (float): Seconds the whole fan-out may take; unfinished calls are dropped
+        on_results (callable): Called as on_results(query, source, results) the moment
+            each search finishes, so later stages can start before the fan-out ends
+        pairs (set): (query, source) pairs to run; None runs the whole grid
+
+    Returns:
+        tuple: (all_results, api_errors, query_timings) where all_results keeps the
+        query-then-engine order of the old serial loop, every result tagged with its
+        'source', and query_timings maps each query to
+        {"elapsed": seconds, "engines": {source: seconds}}
+    """
+    started = time.monotonic()
+    stop_at = started + deadline if deadline else None
+
+    results = {}
+    timings = {query: {"elapsed": 0.0, "engines": {}} for query in queries}
+    api_errors = []
+    timings_lock = threading.Lock()
+
+    def run_one(query, source, search_fn):
+        slot_timeout = max(stop_at - time.monotonic(), 0) if stop_at is not None else None
+        if not _search_slots.acquire(timeout=slot_timeout):
+            raise TimeoutError("no search capacity before the deadline")
+        call_start = time.monotonic()
+        try:
+            return search_fn(query, max_results)
+        finally:
+            _search_slots.release()
+            finished = time.monotonic()
+            with timings_lock:
+                timings[query]["engines"][source] = finished - call_start
+                # Wall time of a query is measured from fan-out start to its slowest engine
+                timings[query]["elapsed"] = max(timings[query]["elapsed"], finished - started)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+    futures = {}
+    try:
+        for query in queries:
+            for source, search_fn in engines:
+                if pairs is not None and (query, source) not in pairs:
+                    continue
+                future = executor.submit(run_one, query, source, search_fn)
+                futures[future] = (query, source)
+
+        pending = set(futures)
+        while pending:
+            timeout = None
+            if stop_at is not None:
+                timeout = stop_at - time.monotonic()
+                if timeout <= 0:
+                    break
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                query, source = futures[future]
+                try:
+                    found = future.result() or []
+                except Exception as e:
+                    error_msg = f"Error searching {source} for query '{query}': {str(e)}"
+                    logs.error(error_msg)
+                    api_errors.append(error_msg)
+                    inc("search_errors_total", source=source)
+                    continue
+                for result in found:
+                    result['source'] = source
+                logs.debug(f"Found {len(found)} {source} results for query: {query}")
+                results[(query, source)] = found
+                if on_results:
+                    on_results(query, source, found)
+
+        if pending:
+            error_msg = (f"Search deadline of {deadline}s exceeded; "
+                         f"{len(pending)} of {len(futures)} searches did not finish")
+            logs.error(error_msg)
+            api_errors.append(error_msg)
+            inc("search_deadline_dropped_total", len(pending))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    all_results = []
+    for query in queries:
+        for source, _ in engines:
+            all_results.extend(results.get((query, source), []))
+
+    # Searches abandoned at the deadline may still be writing their timings
+    with timings_lock:
+        query_timings = {query: {"elapsed": t["elapsed"], "engines": dict(t["engines"])}
+                         for query, t in timings.items()}
+
+    total = time.monotonic() - started
+    slowest = max((t["elapsed"] for t in query_timings.values()), default=0.0)
+    logs.info(f"Fan-out of {len(futures)} searches finished in {total:.2f}s "
+              f"(slowest query {slowest:.2f}s)")
+    observe("search_fanout_seconds", total)
+    for query in queries:
+        for source, secs in query_timings[query]["engines"].items():
+            observe("search_engine_seconds", secs, source=source)
+        if logs.enabled("DEBUG"):
+            engine_times = ", ".join(f"{source}={secs:.2f}s"
+                                     for source, secs in query_timings[query]["engines"].items())
+            logs.debug(f"Query '{query}' took {query_timings[query]['elapsed']:.2f}s ({engine_times})")
+
+    return all_results, api_errors, query_timings
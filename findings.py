@@ -0,0 +1,103 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from canonical import canonical_url
+
+FINDINGS_DB_PATH = os.getenv("FINDINGS_DB_PATH", "findings.sqlite3")
+
+
+def brand_key(brand):
+    """Stored findings are shared by every spelling of a brand that differs only in case or spacing."""
+    return " ".join(brand.lower().split())
+
+
+class FindingsStore:
+    """
+    SQLite-backed record of every URL summarized for each brand.
+
+    One row per (brand, canonical URL) holds the latest summary, which is NULL
+    when the model found nothing negative, its source, and when the URL was
+    first and last seen. Incremental reports use it to skip URLs that were
+    already judged and to tell new findings from old ones. Thread-safe.
+    """
+
+    def __init__(self, path=FINDINGS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS findings (
+                brand TEXT NOT NULL,
+                url_key TEXT NOT NULL,
+                url TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                source TEXT,
+                result TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (brand, url_key)
+            )
+        """)
+        self._conn.commit()
+
+    def seen(self, brand):
+        """Return {canonical URL: first-seen time} for every URL already summarized for `brand`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url_key, first_seen FROM findings WHERE brand = ?", (brand_key(brand),)).fetchall()
+        return dict(rows)
+
+    def record_many(self, brand, kind, outcomes):
+        """
+        Record summarizer outcomes for `brand`.
+
+        Args:
+            brand (str): The brand name
+            kind (str): "web" or "tiktok"
+            outcomes (list): (url, result) pairs; result is the summarizer's dict, or None when
+                the model found nothing negative
+        """
+        if not outcomes:
+            return
+        now = time.time()
+        rows = [(brand_key(brand), canonical_url(url), url, kind, (result or {}).get("source"),
+                 json.dumps(result) if result else None, now, now)
+                for url, result in outcomes]
+        with self._lock:
+            # Keep first_seen from the first run that judged the URL; everything else is the latest verdict
+            self._conn.executemany(
+                "INSERT INTO findings (brand, url_key, url, kind, source, result, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (brand, url_key) DO UPDATE SET url = excluded.url, kind = excluded.kind, "
+                "source = excluded.source, result = excluded.result, last_seen = excluded.last_seen",
+                rows)
+            self._conn.commit()
+
+    def findings(self, brand, kind=None):
+        """Return the stored result dicts with negative content for `brand`, most recently found first."""
+        query = "SELECT result FROM findings WHERE brand = ? AND result IS NOT NULL"
+        params = [brand_key(brand)]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY first_seen DESC, rowid", params).fetchall()
+        return [json.loads(result) for (result,) in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_findings_store():
+    """Return the process-wide FindingsStore, opening it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FindingsStore()
+    return _store
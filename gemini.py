@@ -1,47 +1,253 @@
-
 # ─── Gemini helper ────────────────────────────────────────────────────────────
+import json
 import os
-from google import genai
+import threading
 from dotenv import load_dotenv
-from tiktok_transcript import extract_tiktok_transcripts
+from llm_scheduler import (GEMINI_BATCH_MAX_ITEMS, GEMINI_BATCH_TOKENS, LLMScheduler, estimate_tokens,
+                           pack_batches, truncate_to_tokens)
+from summary_cache import get_summary_cache, summary_key
+from canonical import url_source
+from transcript_compress import TranscriptCompressor
+from metrics import inc, span
+import logs
 
 
 load_dotenv() 
-# Instantiate once at module load
-_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# Bump whenever the TikTok prompt changes so cached summaries are not reused
+TIKTOK_PROMPT_VERSION = "tiktok-v4"
+GEMINI_REQUERY_ROUNDS = int(os.getenv("GEMINI_REQUERY_ROUNDS", "2"))  # retries for items a reply left out
+
+# Batch replies are a JSON array with one object per item, matched by the echoed id.
+# The source platform comes from the URL (canonical.url_source), not the model.
+SUMMARY_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "id": {"type": "INTEGER"},
+            "summary": {"type": "STRING"},
+        },
+        "required": ["id", "summary"],
+    },
+}
+
+# Created on first call; importing the Gen AI SDK is slow and most imports of this module never call it
+_client = None
+_client_lock = threading.Lock()
+
 
-def call_gemini_api(prompt: str) -> str:
+def get_gemini_client():
+    """Return the process-wide Gen AI client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return _client
+
+
+def call_gemini_api(prompt: str, response_schema=None) -> str:
     """
     Sends `prompt` to Gemini Flash 8b via the Gen AI SDK 
     and returns the generated text.
+
+    With `response_schema`, Gemini is constrained to reply with JSON matching it.
     """
     if not os.getenv("GEMINI_API_KEY"):
         raise RuntimeError("Please set GEMINI_API_KEY in your environment")
 
+    config = None
+    if response_schema is not None:
+        config = {"response_mime_type": "application/json", "response_schema": response_schema}
+
     # Generate a single best completion
-    response = _client.models.generate_content(
-        model="gemini-1.5-flash-8b",   # or your preferred Flash model
-        contents=prompt
-    )
+    with span("gemini_call", structured=response_schema is not None):
+        try:
+            response = get_gemini_client().models.generate_content(
+                model="gemini-1.5-flash-8b",   # or your preferred Flash model
+                contents=prompt,
+                config=config
+            )
+        except Exception:
+            inc("llm_calls_total", outcome="error")
+            raise
+    inc("llm_calls_total", outcome="ok")
+
+    # Prefer the token counts Gemini reports; fall back to the local estimate
+    usage = getattr(response, "usage_metadata", None)
+    inc("llm_prompt_tokens_total", getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt))
+    inc("llm_output_tokens_total", getattr(usage, "candidates_token_count", None) or 0)
     return response.text
 
 
+# Shared by every summarizer so the rate limits apply process-wide
+_scheduler = LLMScheduler(call_gemini_api)
+
+
+def call_gemini_batches(prompts):
+    """
+    Send several prompts to Gemini concurrently under the shared rate limits.
+    Returns the response texts in prompt order, with None for failed calls.
+    """
+    return _scheduler.map(prompts)
+
+
+def iter_gemini_batches(prompts):
+    """
+    Like call_gemini_batches, but yields (index, response text) as each call
+    finishes so callers can use early results while later batches are running.
+    """
+    return _scheduler.as_completed(prompts)
+
+
+def parse_structured_reply(text, expected_ids):
+    """
+    Validate a JSON batch reply and index it by item id.
+
+    Entries with an unknown or repeated id, or without a text summary, are
+    dropped so the caller can ask for those items again.
+
+    Returns:
+        dict: item id -> summary
+    """
+    text = (text or "").strip()
+    if text.startswith("```"):
+        # Tolerate a fenced reply even though JSON mode should never produce one
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        entries = json.loads(text)
+    except ValueError as e:
+        logs.warning(f"Could not parse structured reply: {e}")
+        return {}
+    if isinstance(entries, dict):
+        entries = entries.get("items")
+    if not isinstance(entries, list):
+        logs.warning("Structured reply is not a list of items")
+        return {}
+
+    replies = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            item_id = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        summary = entry.get("summary")
+        if item_id not in expected_ids or item_id in replies or not isinstance(summary, str):
+            continue
+        replies[item_id] = summary.strip()
+    return replies
+
+
+def iter_structured_batches(items, build_prompt, max_items=GEMINI_BATCH_MAX_ITEMS,
+                            token_budget=GEMINI_BATCH_TOKENS, requery_rounds=GEMINI_REQUERY_ROUNDS):
+    """
+    Summarize `items` in JSON-mode batches and yield each batch's replies as it arrives.
+
+    Items are packed into as few calls as fit `token_budget`, measured on each
+    item's rendered prompt text. Every item gets an id (its 1-based position in
+    `items`) that the model echoes back, so replies are matched by id rather than
+    by position. Items missing from a reply, or whose whole batch failed, are sent
+    again in half-size batches for up to `requery_rounds` more rounds.
+
+    Args:
+        items (list): Items to summarize
+        build_prompt (callable): Called with a list of (item id, item) pairs; returns the prompt
+        max_items (int): Maximum items per call
+        token_budget (int): Maximum estimated prompt tokens per call, on top of the instructions
+        requery_rounds (int): Extra rounds for items that came back missing
+
+    Yields:
+        tuple: (numbered, replies) where numbered is the batch's (item id, item) pairs
+        and replies maps item id -> summary for the items answered
+    """
+    pending = list(enumerate(items, start=1))
+    # The instructions are sent with every batch; only the items count against the budget
+    overhead = estimate_tokens(build_prompt([]))
+    item_tokens = {item_id: estimate_tokens(build_prompt([(item_id, item)])) - overhead
+                   for item_id, item in pending}
+
+    for round_index in range(requery_rounds + 1):
+        if not pending:
+            return
+        if round_index:
+            max_items = max(1, max(len(numbered) for numbered in batches) // 2)
+            logs.info(f"Re-querying {len(pending)} items missing from structured replies "
+                      f"(round {round_index}/{requery_rounds})")
+        batches = pack_batches(pending, lambda pair: item_tokens[pair[0]], token_budget, max_items)
+        logs.info(f"Sending {len(pending)} items to Gemini in {len(batches)} batches "
+                  f"(~{sum(item_tokens[item_id] for item_id, _ in pending)} item tokens)")
+        prompts = [build_prompt(numbered) for numbered in batches]
+
+        missing = []
+        for batch_index, text in _scheduler.as_completed(prompts, response_schema=SUMMARY_SCHEMA):
+            numbered = batches[batch_index]
+            replies = {}
+            if text is not None:
+                replies = parse_structured_reply(text, {item_id for item_id, _ in numbered})
+            missing.extend(pair for pair in numbered if pair[0] not in replies)
+            inc("llm_items_total", len(replies), outcome="answered")
+            inc("llm_items_total", len(numbered) - len(replies), outcome="missing")
+            yield numbered, replies
+        pending = sorted(missing, key=lambda pair: pair[0])
+
+    if pending:
+        logs.warning(f"{len(pending)} items still missing after {requery_rounds} re-queries")
+
+
 
 # ─── Rewritten batch_summarize_urls ───────────────────────────────────────────
-def batch_summarize_urls_with_gemini(brand, description, url_snippet_pairs, batch_size=5):
+def batch_summarize_urls_with_gemini(brand, description, url_snippet_pairs, batch_size=GEMINI_BATCH_MAX_ITEMS,
+                                     on_result=None, on_outcome=None, keywords=None):
     """
     Process multiple URLs in batches via Gemini Flash 8b REST API.
     Returns a list of dicts with keys: url, summary, sourc.
+
+    Calls are packed up to the shared token budget, with at most `batch_size`
+    videos each. Long transcripts are first cut down to the sentences around
+    mentions of the brand or `keywords` and the most negative-sounding ones
+    (see transcript_compress).
+
+    If given, `on_result(results)` is called with cached results first and then
+    with each batch's results as soon as that batch is parsed.
+
+    If given, `on_outcome(outcomes)` gets the same updates as (url, result) pairs
+    for every video the model judged, with result None when it found nothing
+    negative; videos the model never answered are left out.
     """
     summarized = []
 
-    for i in range(0, len(url_snippet_pairs), batch_size):
-        batch = url_snippet_pairs[i : i + batch_size]
-        print(f"[INFO] Processing batch {i//batch_size + 1} with {len(batch)} URLs")
+    # Only videos whose inputs changed since the last run go to Gemini
+    cache = get_summary_cache()
+    keys = [_tiktok_summary_key(brand, description, item) for item in url_snippet_pairs]
+    cached = cache.get_many(keys)
+    pending = [item for item, key in zip(url_snippet_pairs, keys) if key not in cached]
+    produced = {}
+    logs.info(f"Summary cache: {len(url_snippet_pairs) - len(pending)} cached, "
+              f"{len(pending)} to summarize ({cache.stats()})")
+    inc("summary_cache_lookups_total", len(url_snippet_pairs) - len(pending), kind="tiktok", outcome="hit")
+    inc("summary_cache_lookups_total", len(pending), kind="tiktok", outcome="miss")
+    if on_result:
+        on_result([cached[key] for key in keys if cached.get(key)])
+    if on_outcome:
+        on_outcome([(item[0], cached[key]) for item, key in zip(url_snippet_pairs, keys) if key in cached])
+
+    # Compress each transcript once; the batch packer renders every item more than once
+    compressor = TranscriptCompressor(brand, keywords)
+    compact = {item: compressor.compress(item[2]) for item in pending}
+    raw_tokens = sum(estimate_tokens(item[2] or "") for item in compact)
+    compact_tokens = sum(estimate_tokens(text or "") for text in compact.values())
+    if compact:
+        logs.info(f"Compressed {len(compact)} transcripts from ~{raw_tokens} to ~{compact_tokens} tokens")
+    inc("transcript_tokens_total", raw_tokens, stage="raw")
+    inc("transcript_tokens_total", compact_tokens, stage="compressed")
 
+    def build_prompt(numbered):
         # Build the combined prompt
         prompt = f"""
-You are a TikTok content analyst. For each video below, carefully read the description and full transcript, then determine whether it contains **clear and direct negative mentions** about the brand **"{brand}"**. Think step-by-step:
+You are a TikTok content analyst. For each video below, carefully read the description and transcript (long transcripts are excerpted around the brand mentions; "[...]" marks text left out), then determine whether it contains **clear and direct negative mentions** about the brand **"{brand}"**. Think step-by-step:
 
 Business description:
 \"\"\"{description}\"\"\"
@@ -53,89 +259,78 @@ Your task is to detect **criticism, complaints, or negative sentiment** related
 3. If the content is related to the brand but contains **no criticism, no warning, and no negative opinion**, write **"No negative content"**.
 4. If the content includes **any dissatisfaction, warning, poor experience, scam suspicion, or cautionary tone**, summarize it in 1–2 sentences.
 5. If there are **multiple distinct negative points**, summarize each briefly.
-6. Keep the output format **exactly** as shown below. Do not add extra text or commentary.
+6. Reply with a JSON array only, with exactly one object per video. Do not add extra text or commentary.
 
-Use this exact format:
+Each object has these fields:
+- "id": the ITEM number of the video, copied exactly
+- "summary": A one- or two-sentence summary of negative mentions, or "No negative content", or "unrelated"
 
-ITEM 1:
-URL: <video URL>
-SOURCE: TikTok
-SUMMARY: [A one- or two-sentence summary of negative mentions, or “No negative content”, or “unrelated”]
-
-Now review the following {len(batch)} TikTok videos:
+Now review the following {len(numbered)} TikTok videos:
 """
 
-        for idx, (url, snippet, transcript) in enumerate(batch, start=1):
-            prompt += f"ITEM {idx}:\nURL: {url}\nContent: {snippet}\nVideo Transcript: {transcript}\n\n"
+        for item_id, item in numbered:
+            url, snippet, _ = item
+            prompt += (f"ITEM {item_id}:\nURL: {url}\nContent: {truncate_to_tokens(snippet)}\n"
+                       f"Video Transcript: {compact[item]}\n\n")
+        return prompt
 
-        # Call Gemini
-        try:
-            result_text = call_gemini_api(prompt)
-        except Exception as e:
-            print(f"[ERROR] Gemini API call failed: {e}")
-            continue
+    # Call Gemini for all batches at once and record each reply as it arrives
+    for numbered, replies in iter_structured_batches(pending, build_prompt, max_items=batch_size):
+        batch_results = []
+        batch_outcomes = []
+        batch_cached = {}
 
-        # Parse Gemini’s reply
-        entries = result_text.split("ITEM ")[1:]
-        for idx, item_text in enumerate(entries):
-            if idx >= len(batch):
-                break
-
-            url, _, original_source = batch[idx]
-            source = original_source
-            summary = None
-
-            for line in item_text.splitlines():
-                if line.startswith("SOURCE:"):
-                    source = line.replace("SOURCE:", "").strip().lower()
-                elif line.startswith("SUMMARY:"):
-                    summary = line.replace("SUMMARY:", "").strip()
-
-            # Normalize source into your categories
-            s = source
-            if "reddit" in s:
-                source = "reddit"
-            elif "youtube" in s:
-                source = "youtube"
-            elif "twitter" in s or "x" in s:
-                source = "x"
-            elif "tiktok" in s:
-                source = "tiktok"
-            elif "instagram" in s:
-                source = "instagram"
-            elif "facebook" in s:
-                source = "facebook"
-            elif "trustpilot" in s:
-                source = "trustpilot"
-            elif "google review" in s:
-                source = "google_reviews"
-            elif "google" in s:
-                source = "google"
-            else:
-                source = "other"
+        for item_id, item in numbered:
+            summary = replies.get(item_id)
+            if summary is None:
+                continue
+
+            url = item[0]
+            key = _tiktok_summary_key(brand, description, item)
 
             # Debug the summary extraction
-            print(f"[DEBUG] Raw summary: '{summary}'")
-            if summary:
-                print(f"[DEBUG] Contains 'unrelated': {'unrelated' in summary.lower()}")
-                print(f"[DEBUG] Contains 'no negative content': {'no negative content' in summary.lower()}")
+            logs.debug(f"Raw summary for {url}: '{summary}'", sampled=True)
             
             # Fix the condition and add more robust checking
             if summary and not any(phrase in summary.lower() for phrase in ["unrelated", "no negative content"]):
-                print(f"[DEBUG] Adding result for URL: {url}")
-                summarized.append({
+                logs.debug(f"Adding result for URL: {url}", sampled=True)
+                produced[key] = {
                     "url":     url,
                     "summary": summary,
-                    "source":  source
-                })
+                    "source":  url_source(url, default="tiktok")
+                }
+                batch_cached[key] = produced[key]
+                batch_results.append(produced[key])
+                batch_outcomes.append((url, produced[key]))
             else:
-                print(f"[INFO] No relevant content for URL: {url}")
+                logs.info(f"No relevant content for URL: {url}", sampled=True)
+                if summary:
+                    batch_cached[key] = None
+                    batch_outcomes.append((url, None))
+
+        cache.set_many(batch_cached)
+        if on_result:
+            on_result(batch_results)
+        if on_outcome:
+            on_outcome(batch_outcomes)
+
+    # Merge cached and fresh results back into input order
+    for key in keys:
+        result = cached.get(key) or produced.get(key)
+        if result:
+            summarized.append(result)
 
     return summarized
 
 
+def _tiktok_summary_key(brand, description, item):
+    url, snippet, transcript = item
+    return summary_key(brand, description, url, f"{snippet}\n{transcript}", TIKTOK_PROMPT_VERSION)
+
+
 if __name__ == "__main__":
     from tiktok import search_tiktok, combined_tiktok_results
+    from tiktok_transcript import extract_tiktok_transcripts
 
     print("Starting TikTok scraping and analysis for 'fba brand builder'...")
     
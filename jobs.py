@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import partial
+import logs
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+JOB_POLL_INTERVAL = 1.0  # seconds an idle worker waits before checking the queue again
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "3600"))  # seconds before a 'running' job is retried
+JOB_EVENTS_RETENTION = 600  # seconds a finished job's progress events stay readable
+
+
+class JobEvents:
+    """
+    Progress events published by the jobs running in this process, so clients can
+    follow a job while it runs and replay what they missed. Each job's events are
+    dropped JOB_EVENTS_RETENTION seconds after it finishes. Thread-safe.
+    """
+
+    def __init__(self, retention=JOB_EVENTS_RETENTION):
+        self.retention = retention
+        self._jobs = {}  # job ID -> [events, monotonic time the job finished or None]
+        self._changed = threading.Condition()
+
+    def open(self, job_id):
+        """Start a job's event list afresh, e.g. when a stale job is retried."""
+        with self._changed:
+            self._jobs[job_id] = [[], None]
+            self._changed.notify_all()
+
+    def publish(self, job_id, kind, payload):
+        with self._changed:
+            self._jobs.setdefault(job_id, [[], None])[0].append((kind, payload))
+            self._changed.notify_all()
+
+    def close(self, job_id):
+        """Mark a job finished; readers get its remaining events and then closed=True."""
+        now = time.monotonic()
+        with self._changed:
+            self._jobs.setdefault(job_id, [[], None])[1] = now
+            for expired in [other for other, (_, finished) in self._jobs.items()
+                            if finished is not None and now - finished > self.retention]:
+                del self._jobs[expired]
+            self._changed.notify_all()
+
+    def read(self, job_id, start=0, timeout=None):
+        """
+        Wait up to `timeout` seconds for a job's events from index `start` onwards.
+
+        Returns:
+            tuple: (events, closed) where events is a list of (kind, payload), or None when
+            this process holds no events for the job (not started yet, run by another
+            process, or finished too long ago)
+        """
+        def ready():
+            entry = self._jobs.get(job_id)
+            return entry is not None and (len(entry[0]) > start or entry[1] is not None)
+
+        with self._changed:
+            self._changed.wait_for(ready, timeout)
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return None
+            return entry[0][start:], entry[1] is not None
+
+
+class JobQueue:
+    """
+    Persistent job queue stored in SQLite and drained by a pool of worker threads.
+
+    Jobs survive restarts: anything still queued is picked up by the next
+    process, and jobs left 'running' for longer than JOB_STALE_AFTER (e.g.
+    after a crash) are queued again. Several processes may share one database;
+    a job is claimed inside an IMMEDIATE transaction so only one worker runs it.
+
+    With `events`, the handler also gets an `emit` keyword argument, and each
+    emit(kind, payload) call is published to that JobEvents under the job's ID.
+    """
+
+    def __init__(self, name, handler, workers=2, path=JOBS_DB_PATH, events=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.path = path
+        self.events = events
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    queue TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    group_id TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue_status ON jobs (queue, status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_group ON jobs (group_id)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def start(self):
+        """Start the worker threads once; later calls are no-ops."""
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logs.info(f"Started {self.workers} '{self.name}' job workers")
+
+    def enqueue(self, payload, group=None):
+        """Queue a job and return its ID. Jobs sharing a `group` can be fetched together with get_group."""
+        return self.enqueue_many([payload], group)[0]
+
+    def enqueue_many(self, payloads, group=None):
+        """Queue several jobs in one transaction and return their IDs in order."""
+        job_ids = [uuid.uuid4().hex for _ in payloads]
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO jobs (id, queue, status, payload, created_at, group_id) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                # Spread created_at so workers claim the jobs in list order
+                [(job_id, self.name, json.dumps(payload), now + i * 1e-6, group)
+                 for i, (job_id, payload) in enumerate(zip(job_ids, payloads))])
+            conn.execute("COMMIT")
+        self.start()
+        self._wakeup.set()
+        return job_ids
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if no job with that ID exists in this queue."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ? AND queue = ?", (job_id, self.name)).fetchone()
+        if row is None:
+            return None
+        return _job_dict(row)
+
+    def get_group(self, group):
+        """Return every job of a group in this queue, oldest first."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("SELECT * FROM jobs WHERE group_id = ? AND queue = ? ORDER BY created_at",
+                                (group, self.name)).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def _claim(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute(
+                    "SELECT id, payload FROM jobs WHERE queue = ? AND "
+                    "(status = 'queued' OR (status = 'running' AND started_at < ?)) "
+                    "ORDER BY created_at LIMIT 1",
+                    (self.name, now - JOB_STALE_AFTER)).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (now, row[0]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id))
+
+    def _work(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                logs.error(f"Could not claim '{self.name}' job: {e}")
+                claimed = None
+            if claimed is None:
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload = claimed
+            logs.info(f"Running '{self.name}' job {job_id}")
+            handler = self.handler
+            if self.events is not None:
+                self.events.open(job_id)
+                handler = partial(handler, emit=partial(self.events.publish, job_id))
+            try:
+                result = handler(json.loads(payload))
+            except Exception as e:
+                logs.error(f"'{self.name}' job {job_id} failed: {e}")
+                self._finish(job_id, "failed", error=str(e))
+            else:
+                self._finish(job_id, "done", result=result)
+                logs.info(f"Finished '{self.name}' job {job_id}")
+            # Closed only once the outcome is stored, so readers can fetch it straight away
+            if self.events is not None:
+                self.events.close(job_id)
+
+
+def _job_dict(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
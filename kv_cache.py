@@ -0,0 +1,90 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class KeyValueCache:
+    """
+    SQLite-backed JSON store keyed by string, bounded to `max_entries` rows with
+    least-recently-used eviction. Thread-safe; several processes may share one file.
+    """
+
+    def __init__(self, path, table, max_entries):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_last_access ON {table} (last_access)")
+        self._conn.commit()
+
+    def get_many(self, keys, max_age=None):
+        """
+        Return {key: value} for every key that is cached; value may be None.
+
+        With `max_age`, entries stored more than that many seconds ago count as misses.
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        oldest = now - max_age if max_age is not None else float("-inf")
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, result FROM {self.table} WHERE key IN ({marks}) AND created_at >= ?",
+                    [*chunk, oldest]).fetchall()
+                for key, result in rows:
+                    found[key] = json.loads(result)
+                self._conn.execute(
+                    f"UPDATE {self.table} SET last_access = ? WHERE key IN ({marks})", [now, *chunk])
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, entries):
+        """Store every {key: value} in `entries` in one transaction, evicting once afterwards."""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, result, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(value), now, now) for key, value in entries.items()])
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE rowid IN ("
+                    f"SELECT rowid FROM {self.table} ORDER BY last_access LIMIT ?)",
+                    (overflow,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,172 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from metrics import inc
+import logs
+
+GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "4"))
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))  # requests per minute
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))  # prompt tokens per minute
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BATCH_TOKENS = int(os.getenv("GEMINI_BATCH_TOKENS", "12000"))  # prompt tokens per batched call
+GEMINI_BATCH_MAX_ITEMS = int(os.getenv("GEMINI_BATCH_MAX_ITEMS", "50"))  # items per call; bounds the reply length
+GEMINI_ITEM_MAX_TOKENS = int(os.getenv("GEMINI_ITEM_MAX_TOKENS", "3000"))  # longer texts are truncated
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 60.0  # seconds
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` tokens a minute.
+
+    acquire(n) blocks until n tokens are available. Requests larger than the
+    bucket are allowed through once it is full so they cannot wait forever.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def estimate_tokens(text):
+    """Rough prompt size in tokens (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text, max_tokens=GEMINI_ITEM_MAX_TOKENS):
+    """Cut `text` at a word boundary so it fits in about `max_tokens` tokens."""
+    max_chars = max_tokens * 4
+    if not text or len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut + " [...]"
+
+
+def pack_batches(items, item_tokens, token_budget=GEMINI_BATCH_TOKENS, max_items=GEMINI_BATCH_MAX_ITEMS):
+    """
+    Split `items` into consecutive batches that each fit in a token budget.
+
+    Args:
+        items (list): Items to pack, in order
+        item_tokens (callable): Estimated prompt tokens for one item
+        token_budget (int): Maximum estimated tokens of the items in one batch
+        max_items (int): Maximum items in one batch, whatever their size
+
+    Returns:
+        list: Lists of items; an item over the budget on its own gets a batch to itself
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for item in items:
+        tokens = item_tokens(item)
+        if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def is_retryable(error):
+    """True for rate-limit (429) and server-side (5xx) errors."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "UNAVAILABLE" in message
+
+
+class LLMScheduler:
+    """
+    Keeps up to `max_in_flight` LLM calls running while staying under the
+    requests-per-minute and tokens-per-minute limits shared by every caller.
+    The in-flight cap is also shared, so concurrent reports split it between them.
+    """
+
+    def __init__(self, call_fn, max_in_flight=GEMINI_MAX_IN_FLIGHT, rpm=GEMINI_RPM, tpm=GEMINI_TPM,
+                 max_retries=GEMINI_MAX_RETRIES):
+        self.call_fn = call_fn
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def call(self, prompt, **call_kwargs):
+        """Send one prompt, waiting for rate-limit capacity and retrying 429/5xx with jittered backoff."""
+        attempt = 0
+        while True:
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(estimate_tokens(prompt))
+            try:
+                with self._in_flight:
+                    return self.call_fn(prompt, **call_kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    inc("llm_failures_total")
+                    raise
+                # Full jitter: sleep anywhere between 0 and the exponential ceiling
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                attempt += 1
+                inc("llm_retries_total")
+                logs.warning(f"LLM call failed ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _call_or_none(self, index, prompt, **call_kwargs):
+        try:
+            return self.call(prompt, **call_kwargs)
+        except Exception as e:
+            logs.error(f"LLM batch {index + 1} failed: {e}")
+            return None
+
+    def map(self, prompts, **call_kwargs):
+        """
+        Run every prompt concurrently and return the responses in prompt order.
+
+        A prompt whose call ultimately fails yields None in its slot. Keyword
+        arguments are passed through to `call_fn` for every prompt.
+        """
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(prompts)),
+                                thread_name_prefix="llm") as executor:
+            return list(executor.map(partial(self._call_or_none, **call_kwargs), range(len(prompts)), prompts))
+
+    def as_completed(self, prompts, **call_kwargs):
+        """
+        Run every prompt concurrently and yield (index, response) as each call finishes.
+
+        A prompt whose call ultimately fails yields None as its response. Keyword
+        arguments are passed through to `call_fn` for every prompt.
+        """
+        if not prompts:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(prompts)),
+                                thread_name_prefix="llm") as executor:
+            futures = {executor.submit(self._call_or_none, index, prompt, **call_kwargs): index
+                       for index, prompt in enumerate(prompts)}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
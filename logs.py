@@ -0,0 +1,54 @@
+import logging
+import os
+import random
+import sys
+
+# Lines below LOG_LEVEL are dropped; sampled DEBUG lines are also thinned to LOG_SAMPLE_RATE
+LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR}
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))  # share of sampled lines printed
+# Reports run side by side on worker threads; the thread name tells their lines apart
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(threadName)s: %(message)s"
+
+logger = logging.getLogger("companyscraper")
+logger.setLevel(LEVELS.get(LOG_LEVEL, logging.INFO))
+logger.propagate = False
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(_handler)
+
+
+def enabled(level):
+    """True when lines at `level` would be printed; use it to skip building costly messages."""
+    return logger.isEnabledFor(LEVELS[level])
+
+
+def log(level, message, sampled=False):
+    """
+    Log `message` at `level` when that level is enabled.
+
+    Per-item lines on hot paths pass `sampled=True` so only about
+    LOG_SAMPLE_RATE of them are printed.
+    """
+    if not enabled(level):
+        return
+    if sampled and random.random() >= LOG_SAMPLE_RATE:
+        return
+    logger.log(LEVELS[level], message)
+
+
+def debug(message, sampled=False):
+    log("DEBUG", message, sampled)
+
+
+def info(message, sampled=False):
+    log("INFO", message, sampled)
+
+
+def warning(message):
+    log("WARNING", message)
+
+
+def error(message):
+    log("ERROR", message)
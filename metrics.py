@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_SPAN_BUFFER = int(os.getenv("METRICS_SPAN_BUFFER", "1000"))  # finished spans kept for inspection
+# Histogram bucket upper bounds, in seconds for durations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Registry:
+    """
+    Process-wide counters, gauges, histograms and recent spans, rendered in the
+    Prometheus text exposition format. Thread-safe.
+    """
+
+    def __init__(self, span_buffer=METRICS_SPAN_BUFFER):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+        self.spans = deque(maxlen=span_buffer)
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets),
+                                                     "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def render(self):
+        """Return every metric in the Prometheus text format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((key, dict(h, counts=list(h["counts"]))) for key, h in self._histograms.items())
+
+        lines = []
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), value in gauges:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+            # Each bucket already counts every observation at or below its bound
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_registry = Registry()
+_registry.describe("span_duration_seconds", "Wall time of instrumented operations")
+_registry.describe("span_errors_total", "Instrumented operations that raised")
+
+
+def get_registry():
+    return _registry
+
+
+def inc(name, value=1, **labels):
+    """Add `value` to a counter."""
+    if METRICS_ENABLED:
+        _registry.inc(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to `value`."""
+    if METRICS_ENABLED:
+        _registry.set_gauge(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    """Record one histogram observation."""
+    if METRICS_ENABLED:
+        _registry.observe(name, value, **labels)
+
+
+@contextmanager
+def span(name, **labels):
+    """
+    Time the enclosed block as span `name`.
+
+    The duration goes into the span_duration_seconds histogram, failures are
+    counted in span_errors_total, and the finished span is kept in the registry's
+    recent-spans buffer. Yields a dict that the block may add attributes to.
+    """
+    attributes = {}
+    started = time.time()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except Exception:
+        status = "error"
+        inc("span_errors_total", span=name, **labels)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        if METRICS_ENABLED:
+            _registry.observe("span_duration_seconds", duration, span=name, **labels)
+            _registry.spans.append({"name": name, "labels": labels, "attributes": attributes,
+                                    "start": started, "duration": duration, "status": status,
+                                    "thread": threading.current_thread().name})
+
+
+def recent_spans(name=None, limit=100):
+    """Return up to `limit` of the most recent finished spans, newest first."""
+    # Copy first; other threads keep appending while we filter
+    spans = [s for s in reversed(list(_registry.spans)) if name is None or s["name"] == name]
+    return spans[:limit]
+
+
+def render():
+    """Return the process metrics in the Prometheus text format."""
+    return _registry.render()
@@ -0,0 +1,98 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import span
+import logs
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "500"))  # items buffered between two stages
+
+_DONE = object()  # put on a queue by a finished stage to tell its consumer there is nothing more
+
+
+class Pipeline:
+    """
+    Producer/consumer stages, each on its own thread, joined by bounded queues.
+
+    Every stage starts straight away and works on items as soon as they arrive
+    from upstream, so independent branches run side by side and the wall time
+    is that of the longest branch rather than the sum of all stages.
+    """
+
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.errors = []
+        self._threads = []
+        self._errors_lock = threading.Lock()
+
+    def queue(self):
+        inbox = queue.Queue(maxsize=self.queue_size)
+        inbox.closed = False  # set by drain() once it has seen the producer finish
+        return inbox
+
+    def stage(self, name, fn, *args, inbox=None, outbox=None, error_prefix=None):
+        """
+        Run `fn(*args)` on its own thread. When it returns or fails, `outbox` (if any)
+        is closed so the downstream stage can finish. Failures are recorded in
+        self.errors as "<error_prefix>: <error>".
+
+        If the stage fails, whatever is left in `inbox` is read and thrown away, so
+        the upstream stage is never left blocked on a full queue.
+        """
+        def run():
+            try:
+                with span("pipeline_stage", stage=name):
+                    fn(*args)
+            except Exception as e:
+                error_msg = f"{error_prefix or f'Error in {name} stage'}: {str(e)}"
+                logs.error(error_msg)
+                with self._errors_lock:
+                    self.errors.append(error_msg)
+                if inbox is not None and not inbox.closed:
+                    for _ in drain(inbox):
+                        pass
+            finally:
+                if outbox is not None:
+                    outbox.put(_DONE)
+
+        # Named after the thread that built the pipeline, e.g. "reports-worker-1/dedup", so each
+        # report's log lines can be told apart
+        thread = threading.Thread(target=run, name=f"{threading.current_thread().name}/{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+
+def drain(inbox):
+    """Yield items from `inbox` until the stage feeding it has finished."""
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            inbox.closed = True
+            return
+        yield item
+
+
+def process_in_batches(inbox, batch_size, handle_batch, max_workers):
+    """
+    Group items from `inbox` into batches of `batch_size` and hand each batch to
+    `handle_batch` on a worker pool as soon as it fills (the last batch may be short).
+
+    Returns:
+        list: handle_batch's return values, in batch order
+    """
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers,
+                            thread_name_prefix=f"{threading.current_thread().name}/batch") as executor:
+        batch = []
+        for item in drain(inbox):
+            batch.append(item)
+            if len(batch) == batch_size:
+                futures.append(executor.submit(handle_batch, batch))
+                batch = []
+        if batch:
+            futures.append(executor.submit(handle_batch, batch))
+    return [future.result() for future in futures]
@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import threading
+import time
+
+from canonical import canonical_url
+from findings import brand_key
+
+QUERY_PLAN_DB_PATH = os.getenv("QUERY_PLAN_DB_PATH", "query_plan.sqlite3")
+QUERY_PLAN_ENABLED = os.getenv("QUERY_PLAN_ENABLED", "1") == "1"  # 0 always runs the full keyword x engine grid
+QUERY_PLAN_MIN_YIELD = float(os.getenv("QUERY_PLAN_MIN_YIELD", "0.5"))  # unique URLs per run a pair must add to keep running
+QUERY_PLAN_BUDGET = int(os.getenv("QUERY_PLAN_BUDGET", "0"))  # most searches per report; 0 for no cap
+QUERY_PLAN_REPROBE_AFTER = float(os.getenv("QUERY_PLAN_REPROBE_AFTER", str(28 * 24 * 3600)))  # seconds before a skipped pair runs again
+QUERY_PLAN_MIN_PER_KEYWORD = int(os.getenv("QUERY_PLAN_MIN_PER_KEYWORD", "1"))  # best pairs kept per keyword, low yield or not
+
+
+class QueryPlanner:
+    """
+    Chooses which (keyword, engine) searches to run for a brand from how many
+    unique URLs each one added on earlier runs.
+
+    A URL found by k searches in the same run credits each of them 1/k, so
+    engines that return the same results as another engine, or keywords that
+    only repeat other keywords' results, score low. Pairs whose average yield
+    for the brand is below `min_yield` are skipped until they have not run for
+    `reprobe_after` seconds; the rest are ranked by yield and cut to the budget.
+    Every keyword keeps its `min_per_keyword` best pairs however low they score,
+    so when several engines return the same URLs one of them still runs. A
+    brand's first run measures every pair. Thread-safe.
+    """
+
+    def __init__(self, path=QUERY_PLAN_DB_PATH, min_yield=QUERY_PLAN_MIN_YIELD,
+                 reprobe_after=QUERY_PLAN_REPROBE_AFTER, min_per_keyword=QUERY_PLAN_MIN_PER_KEYWORD):
+        self.path = path
+        self.min_yield = min_yield
+        self.reprobe_after = reprobe_after
+        self.min_per_keyword = min_per_keyword
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_yield (
+                brand TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                runs INTEGER NOT NULL,
+                unique_urls REAL NOT NULL,
+                last_run REAL NOT NULL,
+                PRIMARY KEY (brand, keyword, engine)
+            )
+        """)
+        self._conn.commit()
+
+    def plan(self, brand, keywords, engines, budget=None):
+        """
+        Pick the searches to run.
+
+        Args:
+            brand (str): The brand name
+            keywords (list): Candidate keywords
+            engines (list): Candidate engine names
+            budget (int): Most searches to run; None or 0 for no cap
+
+        Returns:
+            tuple: (pairs, skipped) where pairs is the list of (keyword, engine) to run, best
+            expected yield first, and skipped maps "low_yield" and "budget" to how many were left out
+        """
+        now = time.time()
+        with self._lock:
+            history = {(keyword, engine): (runs, unique_urls, last_run)
+                       for keyword, engine, runs, unique_urls, last_run in self._conn.execute(
+                           "SELECT keyword, engine, runs, unique_urls, last_run FROM query_yield WHERE brand = ?",
+                           (brand_key(brand),))}
+            # Other brands' yields order a new brand's searches when the budget cannot cover them all
+            priors = {(keyword, engine): unique_urls / runs
+                      for keyword, engine, runs, unique_urls in self._conn.execute(
+                          "SELECT keyword, engine, SUM(runs), SUM(unique_urls) FROM query_yield "
+                          "GROUP BY keyword, engine")}
+
+        candidates = []
+        skipped = {}
+        kept = dict.fromkeys(keywords, 0)
+        for position, (keyword, engine) in enumerate((k, e) for k in keywords for e in engines):
+            if (keyword, engine) in history:
+                runs, unique_urls, last_run = history[(keyword, engine)]
+                expected = unique_urls / runs
+                if expected < self.min_yield and now - last_run < self.reprobe_after:
+                    skipped.setdefault(keyword, []).append((-expected, position, (keyword, engine)))
+                    continue
+            else:
+                expected = priors.get((keyword, engine), float("inf"))
+            candidates.append((-expected, position, (keyword, engine)))
+            kept[keyword] += 1
+
+        # URLs every engine finds leave each pair a small share; only the redundant ones are dropped
+        left_out = []
+        for keyword, pairs in skipped.items():
+            pairs.sort()
+            rescued = max(0, self.min_per_keyword - kept[keyword])
+            candidates.extend(pairs[:rescued])
+            left_out.extend(pairs[rescued:])
+        if not candidates and left_out:
+            # Never plan an empty report
+            left_out.sort()
+            candidates.append(left_out.pop(0))
+        low_yield = len(left_out)
+
+        candidates.sort()
+        pairs = [pair for _, _, pair in candidates]
+        over_budget = 0
+        if budget and len(pairs) > budget:
+            over_budget = len(pairs) - budget
+            pairs = pairs[:budget]
+        return pairs, {"low_yield": low_yield, "budget": over_budget}
+
+    def record(self, brand, found):
+        """
+        Record one run's yields.
+
+        Args:
+            brand (str): The brand name
+            found (dict): {(keyword, engine): [url, ...]} for every search that completed,
+                including the ones that returned nothing
+
+        Returns:
+            dict: {(keyword, engine): unique URLs credited to that search}
+        """
+        finders = {}
+        for pair, urls in found.items():
+            for key in {canonical_url(url) for url in urls if url}:
+                finders.setdefault(key, []).append(pair)
+        credit = dict.fromkeys(found, 0.0)
+        for pairs in finders.values():
+            for pair in pairs:
+                credit[pair] += 1 / len(pairs)
+
+        now = time.time()
+        rows = [(brand_key(brand), keyword, engine, value, now) for (keyword, engine), value in credit.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO query_yield (brand, keyword, engine, runs, unique_urls, last_run) "
+                "VALUES (?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (brand, keyword, engine) DO UPDATE SET runs = runs + 1, "
+                "unique_urls = unique_urls + excluded.unique_urls, last_run = excluded.last_run",
+                rows)
+            self._conn.commit()
+        return credit
+
+
+_planner = None
+_planner_lock = threading.Lock()
+
+
+def get_query_planner():
+    """Return the process-wide QueryPlanner, opening it on first use."""
+    global _planner
+    if _planner is None:
+        with _planner_lock:
+            if _planner is None:
+                _planner = QueryPlanner()
+    return _planner
@@ -0,0 +1,95 @@
+import math
+import re
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "we", "were", "with", "you", "your",
+    "our", "us", "they", "their", "i", "my", "me", "co", "inc", "ltd", "llc", "com", "www", "https", "http",
+}
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class RelevanceFilter:
+    """
+    Cheap local check of whether a search result is about the brand at all.
+
+    Each item gets a score in [0, 1]: mostly how well the brand name matches the
+    URL, title and snippet (exact, run together as in hashtags and domains, or
+    fuzzily for typos), plus a small boost for word overlap with the business
+    description. Items scoring below `threshold` never reach the LLM.
+    """
+
+    BRAND_WEIGHT = 0.85
+    DESCRIPTION_WEIGHT = 0.15
+
+    def __init__(self, brand, description, threshold=0.7):
+        self.threshold = threshold
+        self.brand_phrase = " ".join(_tokens(brand))
+        self.brand_compact = self.brand_phrase.replace(" ", "")
+        self.brand_tokens = [t for t in self.brand_phrase.split() if t not in STOPWORDS] or self.brand_phrase.split()
+        self.description_vector = self._vector(_tokens(description))
+        self.kept = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _vector(tokens):
+        counts = Counter(t for t in tokens if t not in STOPWORDS)
+        return {token: 1 + math.log(count) for token, count in counts.items()}
+
+    def brand_score(self, text):
+        tokens = _tokens(text)
+        if not self.brand_compact:
+            return 1.0
+        joined = " ".join(tokens)
+        if f" {self.brand_phrase} " in f" {joined} " or self.brand_compact in joined.replace(" ", ""):
+            return 1.0
+        # Fuzzy: every brand word should have a close match somewhere in the text
+        unique_tokens = set(tokens)
+        total = 0.0
+        for brand_token in self.brand_tokens:
+            best = 0.0
+            for token in unique_tokens:
+                if abs(len(token) - len(brand_token)) > 2:
+                    continue
+                best = max(best, SequenceMatcher(None, brand_token, token).ratio())
+                if best == 1.0:
+                    break
+            total += best
+        return total / len(self.brand_tokens)
+
+    def description_score(self, text):
+        vector = self._vector(_tokens(text))
+        if not vector or not self.description_vector:
+            return 0.0
+        dot = sum(weight * self.description_vector.get(token, 0.0) for token, weight in vector.items())
+        norm = math.sqrt(sum(w * w for w in vector.values())) * math.sqrt(sum(w * w for w in self.description_vector.values()))
+        return dot / norm if norm else 0.0
+
+    def score(self, url, text, title=None):
+        text = f"{title or ''} {text or ''}"
+        combined = f"{url or ''} {text}"
+        return (self.BRAND_WEIGHT * self.brand_score(combined)
+                + self.DESCRIPTION_WEIGHT * self.description_score(text))
+
+    def is_relevant(self, url, text, title=None):
+        """Score one item, count it as kept or dropped, and return True if it should be summarized."""
+        relevant = self.score(url, text, title) >= self.threshold
+        with self._lock:
+            if relevant:
+                self.kept += 1
+            else:
+                self.dropped += 1
+        return relevant
+
+    def stats(self):
+        with self._lock:
+            return {"kept": self.kept, "dropped": self.dropped, "threshold": self.threshold}
@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from metrics import inc, set_gauge
+import logs
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # consecutive failures that open a breaker
+BREAKER_RESET_AFTER = float(os.getenv("BREAKER_RESET_AFTER", "30"))  # seconds an open breaker waits before probing
+BREAKER_PROBES = int(os.getenv("BREAKER_PROBES", "1"))  # calls let through at once while half-open
+TIMEOUT_P95_FACTOR = float(os.getenv("TIMEOUT_P95_FACTOR", "2.0"))  # adaptive timeout = this x observed p95
+TIMEOUT_MIN = float(os.getenv("TIMEOUT_MIN", "2.0"))  # seconds; adaptive timeouts never go below this
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "50"))  # calls slower than this percentile get a duplicate
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))  # most duplicates per call, so hedging stays cheap
+LATENCY_WINDOW = 200  # recent calls per service used for the percentiles
+LATENCY_MIN_SAMPLES = 20  # calls observed before timeouts and hedging adapt
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker for one service. Thread-safe.
+
+    `failure_threshold` consecutive failures open it, and every call is refused
+    for `reset_after` seconds. Then up to `probes` calls at a time go through:
+    one success closes it again, one failure reopens it.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}  # circuit_breaker_state gauge values
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_after=BREAKER_RESET_AFTER,
+                 probes=BREAKER_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.probes = probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        set_gauge("circuit_breaker_state", self.STATE_VALUES[self.state], service=name)
+
+    def allow(self):
+        """Return True when a call may go ahead."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_after:
+                    return False
+                self._transition(self.HALF_OPEN)
+                self._probes_in_flight = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.probes:
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        inc("circuit_breaker_transitions_total", service=self.name, state=state)
+        set_gauge("circuit_breaker_state", self.STATE_VALUES[state], service=self.name)
+        logs.warning(f"Circuit breaker for {self.name} is now {state}")
+
+
+class LatencyWindow:
+    """The last `size` call durations of one service, for percentile estimates. Thread-safe."""
+
+    def __init__(self, size=LATENCY_WINDOW, min_samples=LATENCY_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Nearest-rank percentile, or None until `min_samples` calls have been seen."""
+        with self._lock:
+            ordered = sorted(self._samples)
+        if len(ordered) < self.min_samples:
+            return None
+        rank = max(1, int(round(pct / 100 * len(ordered))))
+        return ordered[min(rank, len(ordered)) - 1]
+
+
+class ServiceGuard:
+    """
+    Circuit breaker, adaptive timeout and request hedging for one remote service.
+
+    The timeout starts at the caller's default and, once enough calls have been
+    seen, becomes TIMEOUT_P95_FACTOR x the observed p95, clamped between
+    TIMEOUT_MIN and the default. With an executor, a call still running after the
+    HEDGE_PERCENTILE latency gets a duplicate, and whichever succeeds first wins;
+    at most HEDGE_MAX_RATE of calls are hedged.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        self.latency = LatencyWindow()
+        self.calls = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def timeout(self, default):
+        p95 = self.latency.percentile(95)
+        if p95 is None:
+            return default
+        return min(default, max(TIMEOUT_MIN, p95 * TIMEOUT_P95_FACTOR))
+
+    def call(self, fn, default_timeout, executor=None):
+        """
+        Call `fn(timeout)` under the breaker, hedging it on `executor` when given.
+
+        Raises:
+            CircuitOpenError: When the breaker is open; `fn` is not called
+        """
+        timeout = self._admit(default_timeout)
+        hedge_after = self._hedge_after() if executor is not None else None
+        started = time.monotonic()
+        try:
+            if hedge_after is None:
+                result = fn(timeout)
+            else:
+                result = self._call_hedged(fn, timeout, hedge_after, executor)
+        except Exception:
+            self._failed(started, timeout)
+            raise
+        self._succeeded(started)
+        return result
+
+    async def call_async(self, fn, default_timeout):
+        """Await `fn(timeout)` under the breaker and adaptive timeout; no hedging."""
+        timeout = self._admit(default_timeout)
+        started = time.monotonic()
+        try:
+            result = await fn(timeout)
+        except Exception:
+            self._failed(started, timeout)
+            raise
+        self._succeeded(started)
+        return result
+
+    def _admit(self, default_timeout):
+        if not self.breaker.allow():
+            inc("circuit_breaker_rejected_total", service=self.name)
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        with self._lock:
+            self.calls += 1
+        timeout = self.timeout(default_timeout)
+        set_gauge("adaptive_timeout_seconds", timeout, service=self.name)
+        return timeout
+
+    def _hedge_after(self):
+        delay = self.latency.percentile(HEDGE_PERCENTILE)
+        with self._lock:
+            if delay is None or self.hedges >= HEDGE_MAX_RATE * self.calls:
+                return None
+        return delay
+
+    def _call_hedged(self, fn, timeout, hedge_after, executor):
+        primary = executor.submit(fn, timeout)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        with self._lock:
+            self.hedges += 1
+            rate = self.hedges / self.calls
+        set_gauge("hedge_rate", rate, service=self.name)
+        hedge = executor.submit(fn, timeout)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                # The slower copy is left to finish on its own; its result is dropped
+                inc("hedged_requests_total", service=self.name, winner="hedge" if future is hedge else "primary")
+                return result
+        inc("hedged_requests_total", service=self.name, winner="none")
+        raise error
+
+    def _succeeded(self, started):
+        self.latency.add(time.monotonic() - started)
+        self.breaker.record_success()
+
+    def _failed(self, started, timeout):
+        elapsed = time.monotonic() - started
+        # A timed-out call says the service is slow; fast errors say nothing about latency
+        if elapsed >= timeout:
+            self.latency.add(elapsed)
+        self.breaker.record_failure()
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name):
+    """Return the process-wide ServiceGuard for `name`, creating it on first use."""
+    guard = _guards.get(name)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(name, ServiceGuard(name))
+    return guard
@@ -0,0 +1,66 @@
+import os
+import threading
+
+from kv_cache import KeyValueCache
+
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "search_cache.sqlite3")
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "50000"))
+
+# Seconds a cached result stays fresh, per search service.
+# Override any of them with SEARCH_CACHE_TTL_<SERVICE>, e.g. SEARCH_CACHE_TTL_REDDIT=3600
+DEFAULT_TTLS = {
+    "google": 24 * 3600,
+    "bing": 24 * 3600,
+    "yahoo": 24 * 3600,
+    "youtube": 48 * 3600,
+    "reddit": 12 * 3600,
+}
+DEFAULT_TTL = 24 * 3600
+
+
+def search_key(service, query, max_results):
+    """Cache key of one Search1API request."""
+    return "\x1f".join([service, str(max_results), query])
+
+
+class SearchCache(KeyValueCache):
+    """
+    Store of Search1API results keyed on (service, query, max_results).
+
+    Entries expire after their service's TTL, and once the table holds more than
+    `max_entries` rows the least recently used ones are evicted.
+    """
+
+    def __init__(self, path=SEARCH_CACHE_PATH, max_entries=SEARCH_CACHE_MAX_ENTRIES, ttls=None):
+        super().__init__(path, "search_results", max_entries)
+        self.ttls = dict(DEFAULT_TTLS)
+        for service in self.ttls:
+            override = os.getenv(f"SEARCH_CACHE_TTL_{service.upper()}")
+            if override:
+                self.ttls[service] = int(override)
+        self.ttls.update(ttls or {})
+
+    def ttl_for(self, service):
+        return self.ttls.get(service, DEFAULT_TTL)
+
+    def get(self, service, query, max_results):
+        """Return the cached results list, or None on a miss or expired entry."""
+        key = search_key(service, query, max_results)
+        return self.get_many([key], max_age=self.ttl_for(service)).get(key)
+
+    def set(self, service, query, max_results, results):
+        super().set(search_key(service, query, max_results), results)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """Return the process-wide SearchCache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache()
+    return _cache
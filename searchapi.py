@@ -1,132 +1,208 @@
 from dotenv import load_dotenv
 import os
 import sys
+import asyncio
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from search_cache import get_search_cache
+from metrics import inc, span
+from resilience import CircuitOpenError, get_guard
+import logs
 
 load_dotenv()
 SEARCH1_API_KEY = os.getenv("SEARCH1_API_KEY")
-def search_search1api(query, MAX_RESULTS):
-    url = "https://api.search1api.com/search"
-    headers = {
-        "Authorization": f"Bearer {SEARCH1_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "query": query,
-        "search_service": "google",  # or "all" if supported
-        "max_results": MAX_RESULTS,
-        "crawl_results": 0,
-        "image": False,
-        "language": ""
-    }
+SEARCH1_API_URL = "https://api.search1api.com/search"
+SEARCH1_POOL_SIZE = int(os.getenv("SEARCH1_POOL_SIZE", "32"))  # keep-alive connections per client
+SEARCH1_TIMEOUT = 10  # seconds; the most any call waits, adaptive timeouts only go lower
+SEARCH1_HEDGE = os.getenv("SEARCH1_HEDGE", "0") == "1"  # 1 duplicates slow calls, each a paid search (see resilience.ServiceGuard)
 
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        print(f"[DEBUG] Raw API response: {data}")  # Print raw for debugging
-        return data.get("results", [])
-    except Exception as e:
-        print(f"[ERROR] Search1API error for query '{query}': {e}")
-        return []
-
-
-def search_search1api_youtube(query, MAX_RESULTS):
-    url = "https://api.search1api.com/search"
-    headers = {
-        "Authorization": f"Bearer {SEARCH1_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "query": query,
-        "search_service": "youtube",  # or "all" if supported
-        "max_results": MAX_RESULTS,
-        "crawl_results": 0,
-        "image": False,
-        "language": ""
-    }
 
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        print(f"[DEBUG] Raw API response: {data}")  # Print raw for debugging
-        return data.get("results", [])
-    except Exception as e:
-        print(f"[ERROR] Search1API error for query '{query}': {e}")
-        return []
-
-def search_search1api_yahoo(query, MAX_RESULTS):
-    url = "https://api.search1api.com/search"
-    headers = {
-        "Authorization": f"Bearer {SEARCH1_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "query": query,
-        "search_service": "yahoo",  # or "all" if supported
-        "max_results": MAX_RESULTS,
-        "crawl_results": 0,
-        "image": False,
-        "language": ""
-    }
+class Search1APIClient:
+    """
+    Search1API client that reuses keep-alive connections across calls.
+
+    One instance is shared by the whole process (see get_client), so the
+    TLS handshake to api.search1api.com is paid once per pooled connection
+    instead of once per search.
+
+    Each service has its own circuit breaker and adaptive timeout, and with
+    `hedge` slow calls are duplicated on a small thread pool.
+    """
+
+    def __init__(self, api_key=None, pool_size=SEARCH1_POOL_SIZE, timeout=SEARCH1_TIMEOUT, cache=None,
+                 hedge=SEARCH1_HEDGE):
+        self.api_key = api_key or SEARCH1_API_KEY
+        self.timeout = timeout
+        self.cache = cache if cache is not None else get_search_cache()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(_headers(self.api_key))
+        # A hedged call runs both copies here, so leave room for two per connection
+        self._hedge_pool = (ThreadPoolExecutor(max_workers=2 * pool_size, thread_name_prefix="search-hedge")
+                            if hedge else None)
+
+    def search_service(self, query, service, max_results, force_refresh=False):
+        """
+        Run one query against one search service and return its results list.
 
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        Results are served from the on-disk cache when fresh; `force_refresh`
+        skips the lookup and overwrites the cached entry.
+
+        Raises:
+            CircuitOpenError: When the service's breaker is open
+            Exception: Whatever the HTTP call raised, once its failure is counted
+        """
+        with span("search1api", service=service) as attributes:
+            if not force_refresh:
+                cached = self.cache.get(service, query, max_results)
+                if cached is not None:
+                    attributes["cache"] = "hit"
+                    return _record_search(service, query, "cache_hit", cached)
+            try:
+                results = get_guard(service).call(
+                    lambda timeout: self._post(query, service, max_results, timeout),
+                    self.timeout, self._hedge_pool)
+            except Exception as e:
+                _record_search(service, query, "breaker_open" if isinstance(e, CircuitOpenError) else "error", [])
+                raise
+        self.cache.set(service, query, max_results, results)
+        return _record_search(service, query, "ok", results)
+
+    def _post(self, query, service, max_results, timeout):
+        response = self.session.post(SEARCH1_API_URL, json=_payload(query, service, max_results), timeout=timeout)
         response.raise_for_status()
-        data = response.json()
-        print(f"[DEBUG] Raw API response: {data}")  # Print raw for debugging
-        return data.get("results", [])
-    except Exception as e:
-        print(f"[ERROR] Search1API error for query '{query}': {e}")
-        return []
-
-def search_search1api_bing(query, MAX_RESULTS):
-    url = "https://api.search1api.com/search"
-    headers = {
-        "Authorization": f"Bearer {SEARCH1_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "query": query,
-        "search_service": "bing",  # or "all" if supported
-        "max_results": MAX_RESULTS,
-        "crawl_results": 0,
-        "image": False,
-        "language": ""
-    }
+        return response.json().get("results", [])
+
+    def search(self, query, services=("google",), max_results=20, force_refresh=False):
+        """
+        Run one query against several search services over the pooled session; a failed service raises.
+
+        Returns:
+            dict: service name -> list of results, in the order of `services`
+        """
+        return {service: self.search_service(query, service, max_results, force_refresh)
+                for service in services}
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        self.session.close()
+
+
+class AsyncSearch1APIClient:
+    """
+    asyncio variant of Search1APIClient backed by a pooled httpx.AsyncClient.
+
+    Use it as `async with AsyncSearch1APIClient() as client:` so the
+    connection pool is closed on the event loop that opened it.
+    """
+
+    def __init__(self, api_key=None, pool_size=SEARCH1_POOL_SIZE, timeout=SEARCH1_TIMEOUT, cache=None):
+        import httpx
+
+        self.api_key = api_key or SEARCH1_API_KEY
+        self.timeout = timeout
+        self.cache = cache if cache is not None else get_search_cache()
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = httpx.AsyncClient(headers=_headers(self.api_key), limits=limits, timeout=timeout)
 
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+    async def search_service(self, query, service, max_results, force_refresh=False):
+        with span("search1api", service=service) as attributes:
+            if not force_refresh:
+                cached = self.cache.get(service, query, max_results)
+                if cached is not None:
+                    attributes["cache"] = "hit"
+                    return _record_search(service, query, "cache_hit", cached)
+            try:
+                # Shares the breakers and latency windows with the threaded client; no hedging here
+                results = await get_guard(service).call_async(
+                    lambda timeout: self._post(query, service, max_results, timeout), self.timeout)
+            except Exception as e:
+                _record_search(service, query, "breaker_open" if isinstance(e, CircuitOpenError) else "error", [])
+                raise
+        self.cache.set(service, query, max_results, results)
+        return _record_search(service, query, "ok", results)
+
+    async def _post(self, query, service, max_results, timeout):
+        response = await self.client.post(SEARCH1_API_URL, json=_payload(query, service, max_results),
+                                          timeout=timeout)
         response.raise_for_status()
-        data = response.json()
-        print(f"[DEBUG] Raw API response: {data}")  # Print raw for debugging
-        return data.get("results", [])
-    except Exception as e:
-        print(f"[ERROR] Search1API error for query '{query}': {e}")
-        return []
-
-def search_search1api_reddit(query, MAX_RESULTS):
-    url = "https://api.search1api.com/search"
-    headers = {
-        "Authorization": f"Bearer {SEARCH1_API_KEY}",
+        return response.json().get("results", [])
+
+    async def search(self, query, services=("google",), max_results=20, force_refresh=False):
+        """Run one query against several search services concurrently; a failed service raises."""
+        results = await asyncio.gather(*(self.search_service(query, service, max_results, force_refresh)
+                                         for service in services))
+        return dict(zip(services, results))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def _record_search(service, query, outcome, results):
+    """Count one search call and its results, then hand the results back."""
+    inc("search_calls_total", service=service, outcome=outcome)
+    inc("search_results_total", len(results), service=service)
+    logs.debug(f"Search1API {service} ({outcome}) returned {len(results)} results for '{query}'", sampled=True)
+    return results
+
+
+def _headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
-    payload = {
+
+
+def _payload(query, service, max_results):
+    return {
         "query": query,
-        "search_service": "reddit",  # or "all" if supported
-        "max_results": MAX_RESULTS,
+        "search_service": service,
+        "max_results": max_results,
         "crawl_results": 0,
         "image": False,
         "language": ""
     }
 
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        print(f"[DEBUG] Raw API response: {data}")  # Print raw for debugging
-        return data.get("results", [])
-    except Exception as e:
-        print(f"[ERROR] Search1API error for query '{query}': {e}")
-        return []
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide Search1APIClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Search1APIClient()
+    return _client
+
+
+def search_search1api(query, MAX_RESULTS, force_refresh=False):
+    return get_client().search_service(query, "google", MAX_RESULTS, force_refresh)
+
+
+def search_search1api_youtube(query, MAX_RESULTS, force_refresh=False):
+    return get_client().search_service(query, "youtube", MAX_RESULTS, force_refresh)
+
+
+def search_search1api_yahoo(query, MAX_RESULTS, force_refresh=False):
+    return get_client().search_service(query, "yahoo", MAX_RESULTS, force_refresh)
+
+
+def search_search1api_bing(query, MAX_RESULTS, force_refresh=False):
+    return get_client().search_service(query, "bing", MAX_RESULTS, force_refresh)
+
+
+def search_search1api_reddit(query, MAX_RESULTS, force_refresh=False):
+    return get_client().search_service(query, "reddit", MAX_RESULTS, force_refresh)
@@ -0,0 +1,41 @@
+import hashlib
+import os
+import threading
+
+from kv_cache import KeyValueCache
+
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "summary_cache.sqlite3")
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "200000"))
+
+
+def summary_key(brand, description, url, content, prompt_version):
+    """Content address of one summarized item; any change to its inputs or the prompt gives a new key."""
+    parts = [prompt_version, brand, description, url, content or ""]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class SummaryCache(KeyValueCache):
+    """
+    Store of LLM outcomes keyed by summary_key.
+
+    The stored value is the result dict the summarizer would have produced, or
+    None when the model judged the item unrelated or free of negative content,
+    so neither kind of item is sent to the LLM again.
+    """
+
+    def __init__(self, path=SUMMARY_CACHE_PATH, max_entries=SUMMARY_CACHE_MAX_ENTRIES):
+        super().__init__(path, "summaries", max_entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """Return the process-wide SummaryCache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SummaryCache()
+    return _cache
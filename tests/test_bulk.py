@@ -0,0 +1,17 @@
+import pytest
+
+from bulk import parse_brands
+
+
+def test_csv_row_with_too_many_fields_is_rejected():
+    text = "brand,keyword\nAcme,scam\nGlobex,scam,extra\n"
+    with pytest.raises(ValueError, match="Row 2 has too many fields"):
+        parse_brands(text, "csv")
+
+
+def test_csv_rows_become_payloads():
+    text = "\ufeffBrand,Keyword,Incremental\n Acme ,scam,yes\nGlobex,fraud,\n"
+    payloads = parse_brands(text)
+    assert [(p["brand"], p["keyword"], p["incremental"]) for p in payloads] == [
+        ("Acme", "scam", True), ("Globex", "fraud", False)]
+    assert payloads[0]["website"] == "" and payloads[0]["force_refresh"] is False
@@ -0,0 +1,22 @@
+from canonical import canonical_url, reddit_post_id, url_source, youtube_video_id
+
+
+def test_malformed_urls_do_not_raise():
+    for url in ["http://[bad", "https://a]b/path", " http://[::1 "]:
+        assert canonical_url(url) == url.strip()
+        assert reddit_post_id(url) is None
+        assert youtube_video_id(url) is None
+        assert url_source(url) == "other"
+        assert url_source(url, default="tiktok") == "tiktok"
+
+
+def test_equivalent_urls_share_a_key():
+    assert canonical_url("https://www.reddit.com/r/a/comments/Abc12/title/") == canonical_url("https://redd.it/abc12")
+    assert canonical_url("https://m.example.com/page/?utm_source=x&b=2&a=1") == "example.com/page?a=1&b=2"
+
+
+def test_url_source_from_host():
+    assert url_source("https://www.box.com/file") == "other"
+    assert url_source("https://uk.trustpilot.com/review/acme.com") == "trustpilot"
+    assert url_source("https://www.google.co.uk/maps/place/Acme") == "google_reviews"
+    assert url_source("https://mobile.twitter.com/acme") == "x"
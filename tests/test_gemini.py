@@ -0,0 +1,78 @@
+import json
+
+import gemini
+from gemini import iter_structured_batches, parse_structured_reply
+
+
+def test_parse_structured_reply_drops_duplicate_unknown_and_bad_ids():
+    reply = json.dumps([
+        {"id": 1, "summary": " first "},
+        {"id": 1, "summary": "repeated"},
+        {"id": "2", "summary": "numeric string"},
+        {"id": 9, "summary": "not asked for"},
+        {"id": "three", "summary": "not a number"},
+        {"id": None, "summary": "no id"},
+        {"id": 3, "summary": None},
+        "not an object",
+    ])
+    assert parse_structured_reply(reply, {1, 2, 3}) == {1: "first", 2: "numeric string"}
+
+
+def test_parse_structured_reply_tolerates_fences_and_rejects_garbage():
+    assert parse_structured_reply('```json\n{"items": [{"id": 1, "summary": "ok"}]}\n```', {1}) == {1: "ok"}
+    assert parse_structured_reply("not json", {1}) == {}
+    assert parse_structured_reply('{"id": 1}', {1}) == {}
+    assert parse_structured_reply(None, {1}) == {}
+
+
+class FakeScheduler:
+    """Answers every item except those in `skip` the first time they are sent; can fail the first batch."""
+
+    def __init__(self, skip=(), fail_first_batch=False):
+        self.skip = set(skip)
+        self.fail_first_batch = fail_first_batch
+        self.calls = []
+
+    def as_completed(self, prompts, response_schema=None):
+        for index, prompt in enumerate(prompts):
+            ids = [int(item_id) for item_id in prompt.split()[1:]]
+            self.calls.append(ids)
+            if self.fail_first_batch:
+                self.fail_first_batch = False
+                yield index, None
+                continue
+            answered = [item_id for item_id in ids if item_id not in self.skip]
+            self.skip -= set(ids)
+            yield index, json.dumps([{"id": item_id, "summary": f"s{item_id}"} for item_id in answered])
+
+
+def build_prompt(numbered):
+    return "ITEMS " + " ".join(str(item_id) for item_id, _ in numbered)
+
+
+def run(monkeypatch, scheduler, items, **kwargs):
+    monkeypatch.setattr(gemini, "_scheduler", scheduler)
+    answered = {}
+    for numbered, replies in iter_structured_batches(items, build_prompt, max_items=4, token_budget=10 ** 6,
+                                                     **kwargs):
+        assert set(replies) <= {item_id for item_id, _ in numbered}
+        answered.update(replies)
+    return answered
+
+
+def test_missing_items_are_requeried_in_smaller_batches(monkeypatch):
+    scheduler = FakeScheduler(skip={2, 7})
+    answered = run(monkeypatch, scheduler, list("abcdefgh"))
+    assert answered == {item_id: f"s{item_id}" for item_id in range(1, 9)}
+    assert scheduler.calls == [[1, 2, 3, 4], [5, 6, 7, 8], [2, 7]]
+
+
+def test_failed_batch_is_requeried_and_rounds_are_capped(monkeypatch):
+    scheduler = FakeScheduler(fail_first_batch=True)
+    answered = run(monkeypatch, scheduler, list("abcdef"))
+    assert answered == {item_id: f"s{item_id}" for item_id in range(1, 7)}
+    assert scheduler.calls == [[1, 2, 3, 4], [5, 6], [1, 2], [3, 4]]
+
+    scheduler = FakeScheduler(skip={1})
+    assert 1 not in run(monkeypatch, scheduler, list("ab"), requery_rounds=0)
+    assert scheduler.calls == [[1, 2]]
@@ -0,0 +1,32 @@
+import time
+
+from jobs import JobEvents, JobQueue
+
+
+def test_events_reach_readers_and_close_after_the_result_is_stored(tmp_path):
+    events = JobEvents()
+
+    def handler(payload, emit):
+        for number in range(payload["count"]):
+            emit("result", {"number": number})
+        return {"count": payload["count"]}
+
+    jobs = JobQueue("test", handler, workers=1, path=str(tmp_path / "jobs.sqlite3"), events=events)
+    job_id = jobs.enqueue({"count": 3})
+
+    received = []
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        progress = events.read(job_id, len(received), timeout=1)
+        if progress is None:
+            continue
+        new, closed = progress
+        received.extend(new)
+        if closed:
+            break
+    assert received == [("result", {"number": n}) for n in range(3)]
+    assert jobs.get(job_id)["status"] == "done"
+
+
+def test_read_unknown_job_returns_none():
+    assert JobEvents().read("missing", timeout=0) is None
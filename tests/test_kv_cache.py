@@ -0,0 +1,9 @@
+from kv_cache import KeyValueCache
+
+
+def test_set_many_stores_a_batch_and_evicts_once(tmp_path):
+    cache = KeyValueCache(str(tmp_path / "kv.sqlite3"), "items", max_entries=3)
+    cache.set("old", {"n": 0})
+    cache.set_many({"a": {"n": 1}, "b": None, "c": [2]})
+    assert cache.get_many(["old", "a", "b", "c"]) == {"a": {"n": 1}, "b": None, "c": [2]}
+    cache.set_many({})
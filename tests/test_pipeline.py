@@ -0,0 +1,83 @@
+import threading
+
+from pipeline import Pipeline, drain
+
+
+def run_with_timeout(pipeline, seconds=10):
+    joined = threading.Event()
+
+    def join():
+        pipeline.join()
+        joined.set()
+
+    threading.Thread(target=join, daemon=True).start()
+    return joined.wait(seconds)
+
+
+def test_failed_stage_does_not_block_its_producer():
+    pipeline = Pipeline(queue_size=5)
+    numbers = pipeline.queue()
+    doubled = pipeline.queue()
+    received = []
+
+    def produce():
+        # Far more items than the queue holds; the producer must never block for good
+        for number in range(200):
+            numbers.put(number)
+
+    def fail_on_first():
+        for number in drain(numbers):
+            raise ValueError(f"bad item {number}")
+
+    def consume():
+        received.extend(drain(doubled))
+
+    pipeline.stage("produce", produce, outbox=numbers)
+    pipeline.stage("double", fail_on_first, inbox=numbers, outbox=doubled, error_prefix="Error doubling")
+    pipeline.stage("consume", consume, inbox=doubled)
+
+    assert run_with_timeout(pipeline), "pipeline did not finish after a stage failed"
+    assert pipeline.errors == ["Error doubling: bad item 0"]
+    assert received == []
+
+
+def test_stage_failing_after_its_inbox_finished_does_not_hang():
+    pipeline = Pipeline(queue_size=5)
+    numbers = pipeline.queue()
+
+    def produce():
+        for number in range(3):
+            numbers.put(number)
+
+    def fail_at_end():
+        list(drain(numbers))
+        raise RuntimeError("failed while reporting")
+
+    pipeline.stage("produce", produce, outbox=numbers)
+    pipeline.stage("report", fail_at_end, inbox=numbers)
+
+    assert run_with_timeout(pipeline)
+    assert len(pipeline.errors) == 1
+
+
+def test_items_flow_through_every_stage():
+    pipeline = Pipeline(queue_size=2)
+    numbers = pipeline.queue()
+    doubled = pipeline.queue()
+    received = []
+
+    def produce():
+        for number in range(50):
+            numbers.put(number)
+
+    def double():
+        for number in drain(numbers):
+            doubled.put(number * 2)
+
+    pipeline.stage("produce", produce, outbox=numbers)
+    pipeline.stage("double", double, inbox=numbers, outbox=doubled)
+    pipeline.stage("consume", lambda: received.extend(drain(doubled)), inbox=doubled)
+
+    assert run_with_timeout(pipeline)
+    assert received == [number * 2 for number in range(50)]
+    assert pipeline.errors == []
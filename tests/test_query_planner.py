@@ -0,0 +1,64 @@
+from query_planner import QueryPlanner
+
+KEYWORDS = ["scam", "fraud", "fake", "complaint"]
+ENGINES = ["google", "reddit", "youtube", "yahoo", "bing"]
+
+
+def test_engines_returning_the_same_urls_still_leave_one_search_per_keyword(tmp_path):
+    planner = QueryPlanner(path=str(tmp_path / "plan.sqlite3"))
+    urls = [f"https://example.com/review/{i}" for i in range(6)]
+    planner.record("Acme", {(keyword, engine): urls for keyword in KEYWORDS for engine in ENGINES})
+
+    pairs, skipped = planner.plan("Acme", KEYWORDS, ENGINES)
+    assert sorted(keyword for keyword, _ in pairs) == sorted(KEYWORDS)
+    assert skipped == {"low_yield": 16, "budget": 0}
+
+
+def test_plan_is_never_empty(tmp_path):
+    planner = QueryPlanner(path=str(tmp_path / "plan.sqlite3"), min_per_keyword=0)
+    planner.record("Acme", {(keyword, engine): ["https://example.com/a"] for keyword in KEYWORDS for engine in ENGINES})
+
+    pairs, skipped = planner.plan("Acme", KEYWORDS, ENGINES)
+    assert len(pairs) == 1
+    assert skipped["low_yield"] == len(KEYWORDS) * len(ENGINES) - 1
+
+
+def test_record_splits_credit_among_the_searches_that_found_a_url(tmp_path):
+    planner = QueryPlanner(path=str(tmp_path / "plan.sqlite3"))
+    credit = planner.record("Acme", {
+        ("scam", "google"): ["https://example.com/a", "https://www.example.com/a?utm_source=x", "https://example.com/b"],
+        ("scam", "bing"): ["https://example.com/a"],
+        ("fraud", "google"): [],
+    })
+    assert credit == {("scam", "google"): 1.5, ("scam", "bing"): 0.5, ("fraud", "google"): 0.0}
+
+
+def test_low_yield_pairs_are_skipped_until_reprobe_and_the_rest_ranked(tmp_path):
+    planner = QueryPlanner(path=str(tmp_path / "plan.sqlite3"), min_yield=0.5)
+    planner.record("Acme", {
+        ("scam", "google"): [f"https://example.com/{i}" for i in range(5)],
+        ("scam", "bing"): [],
+        ("fraud", "google"): ["https://example.com/x"],
+    })
+
+    pairs, skipped = planner.plan("Acme", ["scam", "fraud"], ["google", "bing"])
+    # Unmeasured pairs come first, then by yield; scam/bing found nothing
+    assert pairs == [("fraud", "bing"), ("scam", "google"), ("fraud", "google")]
+    assert skipped == {"low_yield": 1, "budget": 0}
+
+    pairs, skipped = planner.plan("Acme", ["scam", "fraud"], ["google", "bing"], budget=2)
+    assert pairs == [("fraud", "bing"), ("scam", "google")]
+    assert skipped == {"low_yield": 1, "budget": 1}
+
+    reprobing = QueryPlanner(path=str(tmp_path / "plan.sqlite3"), min_yield=0.5, reprobe_after=0)
+    assert ("scam", "bing") in reprobing.plan("Acme", ["scam", "fraud"], ["google", "bing"])[0]
+
+
+def test_other_brands_order_a_new_brands_first_run(tmp_path):
+    planner = QueryPlanner(path=str(tmp_path / "plan.sqlite3"))
+    planner.record("Globex", {("scam", "google"): ["https://example.com/1"],
+                              ("scam", "bing"): [f"https://example.org/{i}" for i in range(4)]})
+
+    pairs, skipped = planner.plan("Acme", ["scam"], ["google", "bing", "yahoo"])
+    assert pairs == [("scam", "yahoo"), ("scam", "bing"), ("scam", "google")]
+    assert skipped == {"low_yield": 0, "budget": 0}
@@ -0,0 +1,10 @@
+from relevance import RelevanceFilter
+
+
+def test_brand_named_only_in_the_title_is_relevant():
+    relevance = RelevanceFilter("Republic Bricks", "Lego compatible building bricks")
+    url = "https://forum.example.com/t/12345"
+    snippet = "Took three months to get a refund and support stopped answering."
+    assert not relevance.is_relevant(url, snippet)
+    assert relevance.is_relevant(url, snippet, title="Republic Bricks order never arrived")
+    assert relevance.stats()["kept"] == 1 and relevance.stats()["dropped"] == 1
@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, LatencyWindow, ServiceGuard
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("test-breaker", failure_threshold=2, reset_after=0.05, probes=1)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_open_breaker_refuses_calls_without_running_them():
+    guard = ServiceGuard("test-refuse")
+    guard.breaker = CircuitBreaker("test-refuse", failure_threshold=1, reset_after=60)
+
+    def failing(timeout):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        guard.call(failing, 1.0)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        guard.call(calls.append, 1.0)
+    assert calls == []
+
+
+def test_hedging_is_capped_at_the_max_rate(monkeypatch):
+    monkeypatch.setattr(resilience, "HEDGE_MAX_RATE", 0.1)
+    guard = ServiceGuard("test-hedge")
+    guard.latency = LatencyWindow(size=1000, min_samples=1)
+    for _ in range(500):
+        guard.latency.add(0.001)  # every call below is slower than the usual p50
+
+    started = []
+
+    def slow(timeout):
+        started.append(timeout)
+        time.sleep(0.02)
+        return "ok"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = [guard.call(slow, 1.0, executor=executor) for _ in range(20)]
+    assert results == ["ok"] * 20
+    assert guard.calls == 20 and guard.hedges == 2
+    assert len(started) == 22
+
+
+def test_adaptive_timeout_follows_p95_within_bounds(monkeypatch):
+    monkeypatch.setattr(resilience, "TIMEOUT_MIN", 0.5)
+    guard = ServiceGuard("test-timeout")
+    guard.latency = LatencyWindow(min_samples=3)
+    assert guard.timeout(10.0) == 10.0
+    for seconds in (1.0, 1.0, 2.0):
+        guard.latency.add(seconds)
+    assert guard.timeout(10.0) == 2.0 * resilience.TIMEOUT_P95_FACTOR
+    assert guard.timeout(1.5) == 1.5
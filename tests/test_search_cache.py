@@ -0,0 +1,32 @@
+import time
+
+from search_cache import SearchCache
+
+
+def test_entries_are_keyed_on_service_query_and_size(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "search.sqlite3"))
+    cache.set("google", "acme scam", 20, [{"link": "https://a.example"}])
+    cache.set("google", "acme scam", 10, [])
+    assert cache.get("google", "acme scam", 20) == [{"link": "https://a.example"}]
+    assert cache.get("google", "acme scam", 10) == []
+    assert cache.get("bing", "acme scam", 20) is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_their_service_ttl(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "search.sqlite3"), ttls={"reddit": 0.05})
+    cache.set("reddit", "acme", 20, ["fresh"])
+    cache.set("google", "acme", 20, ["kept"])
+    time.sleep(0.1)
+    assert cache.get("reddit", "acme", 20) is None
+    assert cache.get("google", "acme", 20) == ["kept"]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "search.sqlite3"), max_entries=2)
+    cache.set("google", "a", 20, ["a"])
+    cache.set("google", "b", 20, ["b"])
+    cache.get("google", "a", 20)
+    cache.set("google", "c", 20, ["c"])
+    assert cache.get("google", "b", 20) is None
+    assert cache.get("google", "a", 20) == ["a"]
@@ -0,0 +1,46 @@
+from llm_scheduler import estimate_tokens
+from transcript_compress import TranscriptCompressor, _sentence_spans
+
+FILLER = "so today we are unboxing the starter kit and going through every single piece in the box"
+
+
+def test_short_transcripts_are_returned_unchanged():
+    compressor = TranscriptCompressor("Acme", max_tokens=400)
+    assert compressor.compress("Acme was fine.") == "Acme was fine."
+    assert compressor.compress("") == ""
+
+
+def test_unpunctuated_captions_are_cut_into_windows():
+    words = " ".join([FILLER] * 20).split()
+    spans = _sentence_spans(" ".join(words), max_words=40)
+    assert len(spans) == -(-len(words) // 40)
+
+    caption = " ".join([FILLER] * 15 + ["honestly acme is a scam and they never sent my refund"] + [FILLER] * 15)
+    compressed = TranscriptCompressor("Acme", max_tokens=60, context=0).compress(caption)
+    assert "acme is a scam" in compressed
+    assert compressed.startswith("[...]") and compressed.endswith("[...]")
+    assert estimate_tokens(compressed) <= 60 + 10
+
+
+def test_budget_smaller_than_one_window_still_keeps_the_mention():
+    caption = " ".join([FILLER] * 10 + ["acme took my money"] + [FILLER] * 10)
+    compressed = TranscriptCompressor("Acme", max_tokens=12, context=0).compress(caption)
+    assert "acme took my money" in compressed
+    assert estimate_tokens(compressed) <= 12 + 5
+
+
+def test_mentions_rank_above_sentiment_and_keep_their_order():
+    transcript = ("Intro about the weather. " * 30 + "The course was a waste. " + "More filler here. " * 30
+                  + "Acme Brand Builder never answered. " + "Closing words. " * 30)
+    compressed = TranscriptCompressor("Acme Brand Builder", max_tokens=12, context=0).compress(transcript)
+    assert "Acme Brand Builder never answered." in compressed
+    assert "waste" not in compressed
+
+    roomy = TranscriptCompressor("Acme Brand Builder", max_tokens=40, context=0).compress(transcript)
+    assert roomy.index("waste") < roomy.index("never answered")
+
+
+def test_nothing_relevant_falls_back_to_the_opening():
+    transcript = "Intro about the weather. " * 100
+    compressed = TranscriptCompressor("Acme", max_tokens=20).compress(transcript)
+    assert compressed.startswith("Intro about the weather.") and compressed.endswith("[...]")
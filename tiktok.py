@@ -1,11 +1,37 @@
-from apify_client import ApifyClient
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from gemini import call_gemini_api
 from searchapi import search_search1api
+from canonical import canonical_url
+from tiktok_transcript import apify_run_slots
+from metrics import inc, span
+import logs
 
 load_dotenv()
 
+# "single_run" sends every keyword to one actor run; "concurrent" starts one run per keyword in parallel
+TIKTOK_SEARCH_MODE = os.getenv("TIKTOK_SEARCH_MODE", "single_run")
+
+_apify_client = None
+_apify_client_lock = threading.Lock()
+
+
+def get_apify_client():
+    """Return the process-wide ApifyClient, or None when APIFY_API_TOKEN is not set."""
+    global _apify_client
+    if _apify_client is None:
+        apify_token = os.getenv("APIFY_API_TOKEN")
+        if not apify_token:
+            return None
+        with _apify_client_lock:
+            if _apify_client is None:
+                # Imported here so workers that never search TikTok skip loading the SDK
+                from apify_client import ApifyClient
+                _apify_client = ApifyClient(apify_token)
+    return _apify_client
+
 def generate_tiktok_keywords(brand_keyword):
     try:
         # 1. Get online search results from your custom API
@@ -46,30 +72,45 @@ def generate_tiktok_keywords(brand_keyword):
         return keywords[:5]
 
     except Exception as e:
-        print(f"[ERROR] generate_tiktok_keywords failed: {e}")
+        logs.error(f"generate_tiktok_keywords failed: {e}")
         return []
 
 
-def combined_tiktok_results(brand, brandkeyword):
+def combined_tiktok_results(brand, brandkeyword, mode=None):
+    """
+    Search TikTok for every generated keyword and return the results de-duplicated by link.
+
+    With mode "single_run" (the default, see TIKTOK_SEARCH_MODE) all keywords go to a
+    single actor run so there is only one cold start; "concurrent" runs one actor
+    per keyword at the same time.
+    """
+    mode = mode or TIKTOK_SEARCH_MODE
     total_results = []
     seen_links = set()  # Track unique links
     
     keywords = generate_tiktok_keywords(brandkeyword)
-    print(f"[INFO] Generated TikTok search keywords: {keywords}")
-    
-    for word in keywords:
-        search_query = f"{brand} {word}"
-        print(f"[INFO] Searching TikTok for: '{search_query}'")
-        tiktok_result = search_tiktok(search_query, max_results=20)
-        
-        # Only add results with unique links
-        for result in tiktok_result:
-            link = result.get("link", "")
-            if link and link not in seen_links:
-                seen_links.add(link)
-                total_results.append(result)
+    logs.info(f"Generated TikTok search keywords: {keywords}")
+    search_queries = [f"{brand} {word}" for word in keywords]
+    if not search_queries:
+        return []
+
+    if mode == "concurrent":
+        logs.info(f"Searching TikTok concurrently for: {search_queries}")
+        with ThreadPoolExecutor(max_workers=len(search_queries), thread_name_prefix="tiktok") as executor:
+            per_query = list(executor.map(lambda query: search_tiktok(query, max_results=20), search_queries))
+        tiktok_results = [result for results in per_query for result in results]
+    else:
+        tiktok_results = search_tiktok_multi(search_queries, max_results=20)
+
+    # Only add results with unique videos, however their links are written
+    for result in tiktok_results:
+        link = result.get("link", "")
+        key = canonical_url(link)
+        if link and key not in seen_links:
+            seen_links.add(key)
+            total_results.append(result)
     
-    print(f"[INFO] Found {len(total_results)} unique TikTok results across all keywords")
+    logs.info(f"Found {len(total_results)} unique TikTok results across all keywords")
     return total_results
 
 
@@ -81,22 +122,33 @@ def search_tiktok(query, max_results=20):
         query (str): The search query
         max_results (int): Maximum number of results to return
         
+    Returns:
+        list: List of dictionaries with 'link', 'title', and 'snippet' keys
+    """
+    return search_tiktok_multi([query], max_results)
+
+
+def search_tiktok_multi(queries, max_results=20):
+    """
+    Search TikTok for several queries in a single actor run.
+
+    Args:
+        queries (list): The search queries
+        max_results (int): Maximum number of results to return per query
+
     Returns:
         list: List of dictionaries with 'link', 'title', and 'snippet' keys
     """
     try:
-        # Initialize the client with your Apify API token
-        apify_token = os.getenv("APIFY_API_TOKEN")
-        if not apify_token:
-            print("[ERROR] APIFY_API_TOKEN not found in environment variables")
+        client = get_apify_client()
+        if client is None:
+            logs.error("APIFY_API_TOKEN not found in environment variables")
             return []
-            
-        client = ApifyClient(apify_token)
 
         # Define the Actor input to search TikTok by phrase
         run_input = {
-            "searchQueries": [query],  # Must be present or run will fail
-            "resultsPerPage": max_results,  # Number of videos to fetch
+            "searchQueries": list(queries),  # Must be present or run will fail
+            "resultsPerPage": max_results,  # Number of videos to fetch per query
             # Optional: restrict to video results only
             "searchSection": "/video",
             # Optional: use Apify Proxy for stability
@@ -104,13 +156,14 @@ def search_tiktok(query, max_results=20):
         }
 
         # Run the TikTok Scraper Actor and wait for it to finish
-        print(f"[INFO] Starting TikTok search for query: {query}")
-        actor = client.actor("clockworks/tiktok-scraper")
-        call_result = actor.call(run_input=run_input)
-
-        # Get results from the dataset
-        dataset = client.dataset(call_result["defaultDatasetId"])
-        items = list(dataset.iterate_items())
+        logs.info(f"Starting TikTok search for queries: {queries}")
+        with apify_run_slots, span("tiktok_search", queries=len(queries)):
+            actor = client.actor("clockworks/tiktok-scraper")
+            call_result = actor.call(run_input=run_input)
+
+            # Get results from the dataset
+            dataset = client.dataset(call_result["defaultDatasetId"])
+            items = list(dataset.iterate_items())
         
         # Format results to match the structure expected by app.py
         formatted_results = []
@@ -122,11 +175,14 @@ def search_tiktok(query, max_results=20):
                 "source": "tiktok"
             })
             
-        print(f"[INFO] Found {len(formatted_results)} TikTok results for query: {query}")
+        logs.info(f"Found {len(formatted_results)} TikTok results for queries: {queries}")
+        inc("tiktok_searches_total", outcome="ok")
+        inc("tiktok_results_total", len(formatted_results))
         return formatted_results
         
     except Exception as e:
-        print(f"[ERROR] TikTok search error for query '{query}': {e}")
+        logs.error(f"TikTok search error for queries {queries}: {e}")
+        inc("tiktok_searches_total", outcome="error")
         return []
 
 # Example usage (only runs when script is executed directly)
@@ -1,42 +1,126 @@
-from apify_client import ApifyClient
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from kv_cache import KeyValueCache
+from canonical import canonical_url, tiktok_video_id
+from metrics import inc, span
+import logs
 
 load_dotenv()  # ensure APIFY_TOKEN is loaded
 
+TRANSCRIPT_ACTOR_ID = "emQXBCL3xePZYgJyn"  # transcript-extractor actor
+TRANSCRIPT_CHUNK_SIZE = int(os.getenv("TRANSCRIPT_CHUNK_SIZE", "10"))  # videos per actor run
+TRANSCRIPT_MAX_WORKERS = int(os.getenv("TRANSCRIPT_MAX_WORKERS", "4"))  # actor runs at the same time
+TRANSCRIPT_CACHE_PATH = os.getenv("TRANSCRIPT_CACHE_PATH", "transcript_cache.sqlite3")
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "100000"))
+APIFY_MAX_CONCURRENT_RUNS = int(os.getenv("APIFY_MAX_CONCURRENT_RUNS", "8"))  # actor runs across all reports
+
+# Every Apify actor run in the process (TikTok search and transcripts) takes a slot first
+apify_run_slots = threading.BoundedSemaphore(APIFY_MAX_CONCURRENT_RUNS)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_transcript_cache():
+    """Return the process-wide transcript cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = KeyValueCache(TRANSCRIPT_CACHE_PATH, "transcripts", TRANSCRIPT_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def transcript_cache_key(url):
+    """Cache key for a TikTok video: its numeric ID, or its canonical URL when it has none."""
+    return tiktok_video_id(url) or canonical_url(url or "")
+
+
 def extract_tiktok_transcripts(urls):
     """
     Given a list of TikTok video URLs, runs the Apify actor that extracts transcripts
-    and returns a list of (url, transcript) tuples.
+    and returns a list of (url, description, transcript) tuples.
+    """
+    results = list(iter_tiktok_transcripts(urls))
+    logs.info(f"Extracted {len(results)} transcripts.")
+    return results
+
+
+def iter_tiktok_transcripts(urls, chunk_size=TRANSCRIPT_CHUNK_SIZE, max_workers=TRANSCRIPT_MAX_WORKERS):
+    """
+    Yield (url, description, transcript) tuples as they become available.
+
+    Videos already in the transcript cache are yielded first. The rest are split
+    into chunks of `chunk_size` that run as separate actor runs at the same time,
+    and each chunk's items are yielded as soon as its dataset is ready. A failed
+    chunk is logged and skipped without losing the others.
     """
     token = os.getenv("APIFY_API_TOKEN")
     if not token:
         raise RuntimeError("APIFY_TOKEN not set in environment")
 
+    cache = get_transcript_cache()
+    video_ids = [transcript_cache_key(url) for url in urls]
+    cached = cache.get_many(video_ids)
+    pending = [url for url, video_id in zip(urls, video_ids) if video_id not in cached]
+    logs.info(f"Transcript cache: {len(urls) - len(pending)} cached, {len(pending)} to extract")
+    inc("transcript_cache_lookups_total", len(urls) - len(pending), outcome="hit")
+    inc("transcript_cache_lookups_total", len(pending), outcome="miss")
+
+    for video_id in dict.fromkeys(video_ids):
+        if video_id in cached:
+            yield tuple(cached[video_id])
+
+    if not pending:
+        return
+
+    from apify_client import ApifyClient
     client = ApifyClient(token)
-    actor_id = "emQXBCL3xePZYgJyn"  # transcript-extractor actor
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)), thread_name_prefix="transcripts") as executor:
+        futures = {executor.submit(_run_transcript_actor, client, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                chunk_results = future.result()
+            except Exception as e:
+                logs.error(f"Transcript extraction failed for {len(futures[future])} videos: {e}")
+                inc("transcript_errors_total")
+                continue
+            # Videos without a transcript may get one later, so only real transcripts are kept
+            cache.set_many({transcript_cache_key(result[0]): list(result)
+                            for result in chunk_results if result[2] != "No Transcript"})
+            for result in chunk_results:
+                inc("transcripts_extracted_total", found=str(result[2] != "No Transcript").lower())
+                yield result
 
+
+def _run_transcript_actor(client, urls):
     # Actor input: must be {"videos": [...]}
     run_input = {"videos": urls}
 
-    print(f"[INFO] Starting actor {actor_id} for {len(urls)} videos…")
-    run = client.actor(actor_id).call(run_input=run_input)
+    logs.info(f"Starting actor {TRANSCRIPT_ACTOR_ID} for {len(urls)} videos…")
+    with apify_run_slots, span("transcript_chunk"):
+        run = client.actor(TRANSCRIPT_ACTOR_ID).call(run_input=run_input)
 
-    # Fetch the default dataset for this run
-    dataset = client.dataset(run["defaultDatasetId"])
+        # Fetch the default dataset for this run
+        dataset = client.dataset(run["defaultDatasetId"])
+        items = list(dataset.iterate_items())
 
     results = []
-    for item in dataset.iterate_items():
+    for item in items:
         # Expect each item to have at least {"url": ..., "transcript": ...}
         url        = item.get("url")
+        if not url:
+            # Nothing downstream can key, cache or link an item without its video
+            continue
         description = item.get("description") or item.get("text") or ""
         if item.get("transcript", ""):
             transcript = item.get("transcript", "").strip()
         else:
             transcript = "No Transcript"
         results.append((url, description, transcript))
-
-    print(f"[INFO] Extracted {len(results)} transcripts.")
     return results
  
 
@@ -0,0 +1,123 @@
+import bisect
+import os
+import re
+
+from llm_scheduler import estimate_tokens, truncate_to_tokens
+
+TRANSCRIPT_MAX_TOKENS = int(os.getenv("TRANSCRIPT_MAX_TOKENS", "400"))  # per-video transcript budget; 0 only truncates
+TRANSCRIPT_CONTEXT = int(os.getenv("TRANSCRIPT_CONTEXT", "1"))  # sentences kept either side of a brand or keyword mention
+SENTENCE_MAX_WORDS = 40  # auto captions often have no punctuation; longer runs are cut into windows this size
+
+# Score each match adds to its sentence
+WEIGHTS = {"brand": 3.0, "keyword": 2.0, "sentiment": 1.0}
+
+# Words and phrases that mark complaints, warnings and bad experiences
+SENTIMENT_TERMS = [
+    "scam", "scammed", "scammer", "scammy", "fraud", "fake", "rip off", "ripoff", "ripped off", "refund",
+    "money back", "waste", "wasted", "terrible", "horrible", "awful", "worst", "bad", "avoid", "warning",
+    "beware", "lied", "lying", "liar", "misleading", "shady", "sketchy", "complaint", "complain",
+    "disappointed", "disappointing", "regret", "stole", "stolen", "charged", "cancel", "ignored",
+    "unprofessional", "garbage", "trash", "useless", "not worth", "overpriced", "hidden fees", "pyramid",
+    "mlm", "lawsuit", "sued", "exposed", "red flag", "don't buy", "do not buy", "never again",
+]
+
+_SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]*")
+_WORD_RE = re.compile(r"\S+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _phrase_pattern(phrase):
+    """Regex for a phrase however it is spaced or joined, as in hashtags; None for an empty phrase."""
+    tokens = _TOKEN_RE.findall((phrase or "").lower())
+    if not tokens:
+        return None
+    return r"(?<![a-z0-9])" + r"[\W_]*".join(re.escape(token) for token in tokens)
+
+
+def _sentence_spans(text, max_words=SENTENCE_MAX_WORDS):
+    """(start, end) offsets of the sentences in `text`, runs longer than `max_words` cut into word windows."""
+    spans = []
+    for sentence in _SENTENCE_RE.finditer(text):
+        words = list(_WORD_RE.finditer(text, sentence.start(), sentence.end()))
+        for first in range(0, len(words), max_words):
+            window = words[first:first + max_words]
+            spans.append((window[0].start(), window[-1].end()))
+    return spans
+
+
+class TranscriptCompressor:
+    """
+    Cuts long transcripts down to the sentences that matter for one brand.
+
+    Every sentence is scored in a single pass of one combined regex over the
+    whole transcript: brand mentions, then keyword mentions, then complaint and
+    warning words. Sentences around each brand or keyword mention come along as
+    context. The best-scoring sentences that fit `max_tokens` are kept in their
+    original order, with "[...]" where text was left out. Transcripts already
+    within the budget are returned unchanged.
+    """
+
+    def __init__(self, brand, keywords=(), max_tokens=TRANSCRIPT_MAX_TOKENS, context=TRANSCRIPT_CONTEXT):
+        self.max_tokens = max_tokens
+        self.context = context
+        groups = []
+        brand_pattern = _phrase_pattern(brand)
+        if brand_pattern:
+            groups.append(f"(?P<brand>{brand_pattern})")
+        keyword_patterns = [pattern for pattern in map(_phrase_pattern, keywords or ()) if pattern]
+        if keyword_patterns:
+            groups.append(f"(?P<keyword>{'|'.join(keyword_patterns)})")
+        sentiment = "|".join(sorted((re.escape(term).replace(r"\ ", r"\s+") for term in SENTIMENT_TERMS),
+                                    key=len, reverse=True))
+        groups.append(rf"(?P<sentiment>\b(?:{sentiment})\b)")
+        self._pattern = re.compile("|".join(groups), re.IGNORECASE)
+
+    def compress(self, transcript):
+        if not self.max_tokens:
+            return truncate_to_tokens(transcript)
+        if not transcript or estimate_tokens(transcript) <= self.max_tokens:
+            return transcript
+
+        # A budget smaller than a full window would otherwise fit no window at all
+        spans = _sentence_spans(transcript, max(1, min(SENTENCE_MAX_WORDS, self.max_tokens // 2)))
+        starts = [start for start, _ in spans]
+        scores = [0.0] * len(spans)
+        mentions = []
+        for match in self._pattern.finditer(transcript):
+            index = bisect.bisect_right(starts, match.start()) - 1
+            if index < 0:
+                continue
+            scores[index] += WEIGHTS[match.lastgroup]
+            if match.lastgroup != "sentiment":
+                mentions.append(index)
+
+        priority = list(scores)
+        for index in mentions:
+            for neighbour in range(max(0, index - self.context), min(len(spans), index + self.context + 1)):
+                # Context sentences rank just below the mention that pulled them in
+                priority[neighbour] = max(priority[neighbour], scores[index] - 0.5)
+        ranked = sorted((i for i in range(len(spans)) if priority[i] > 0), key=lambda i: (-priority[i], i))
+
+        chosen = []
+        used = 0
+        for index in ranked:
+            start, end = spans[index]
+            cost = estimate_tokens(transcript[start:end]) + 1
+            if used + cost <= self.max_tokens:
+                chosen.append(index)
+                used += cost
+        if not chosen:
+            # Nothing mentions the brand or sounds negative; the opening is as good as anything
+            return truncate_to_tokens(transcript, self.max_tokens)
+
+        parts = []
+        previous = -1
+        for index in sorted(chosen):
+            if index != previous + 1:
+                parts.append("[...]")
+            start, end = spans[index]
+            parts.append(transcript[start:end])
+            previous = index
+        if previous != len(spans) - 1:
+            parts.append("[...]")
+        return " ".join(parts)
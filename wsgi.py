@@ -0,0 +1,4 @@
+"""WSGI entry point, e.g. `gunicorn wsgi:app`. Importing app starts no workers; this does."""
+from app import app, start_workers
+
+start_workers()